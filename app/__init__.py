@@ -21,6 +21,30 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY=os.environ.get('SECRET_KEY', 'default-dev-key-only'),
         DATABASE=os.path.join(app.instance_path, 'cuisinade.sqlite'),
+        # Réutiliser les connexions SQLite d'une requête à l'autre au lieu d'en
+        # ouvrir une par requête ; au plus DB_POOL_SIZE inactives par processus
+        DB_POOL=True,
+        DB_POOL_SIZE=8,
+        SQLITE_JOURNAL_MODE='WAL',
+        SQLITE_SYNCHRONOUS='NORMAL',
+        SQLITE_CACHE_SIZE=-16000,  # en Kio quand négatif, soit ~16 Mo
+        SQLITE_MMAP_SIZE=64 * 1024 * 1024,
+        SQLITE_TEMP_STORE='MEMORY',
+        SQLITE_BUSY_TIMEOUT=5.0,  # secondes d'attente si la base est verrouillée
+        # Cache des pages rendues (app.cache)
+        PAGE_CACHE=True,
+        PAGE_CACHE_SIZE=512,  # nombre de fragments gardés en mémoire par processus
+        PAGE_CACHE_DIR=None,  # dossier partagé entre workers, désactivé si None
+        PAGE_CACHE_HOME_TTL=60,  # secondes avant un nouveau tirage de la page d'accueil
+        # Processus qui optimisent les images envoyées, 0 pour traiter en fin de requête
+        IMAGE_WORKERS=2,
+        # Durée de vie (secondes) des statistiques du tableau de bord admin,
+        # recalculées de toute façon après chaque écriture
+        ADMIN_STATS_TTL=30,
+        # Secondes entre deux reconstructions de l'index d'autocomplétion des
+        # ingrédients (compteurs d'utilisation) ; les nouveaux types y sont
+        # ajoutés dès la requête suivante
+        INGREDIENT_INDEX_TTL=300,
     )
 
     if test_config is None:
@@ -52,6 +76,24 @@ def create_app(test_config=None):
     from . import db
     db.init_app(app)
 
+    from . import search
+    search.init_app(app)
+
+    from . import cache
+    cache.init_app(app)
+
+    from . import image_handler
+    image_handler.init_app(app)
+
+    from . import autocomplete
+    autocomplete.init_app(app)
+
+    from . import pantry
+    pantry.init_app(app)
+
+    from . import similar
+    similar.init_app(app)
+
     # register the auth blueprint
     from . import auth
     app.register_blueprint(auth.bp)
@@ -0,0 +1,250 @@
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+
+from app.cache import get_page_cache
+from app.db import data_version
+
+# Tables dont dépendent les statistiques du tableau de bord
+DASHBOARD_TABLES = ('comments', 'favourites', 'ingredient_type', 'recipes', 'user')
+DETAIL_TABLES = ('comments', 'recipes')
+# Tables dont les ajouts alimentent activity_daily
+ACTIVITY_TABLES = ('comments', 'favourites', 'recipes', 'user')
+
+ACTIVITY_METRICS = ('signups', 'recipes', 'comments', 'favourites')
+ACTIVITY_BUCKETS = ('day', 'week')
+# Plus longue période servie par activity_series, en jours
+ACTIVITY_MAX_DAYS = 3 * 366
+
+# Les compteurs en une seule requête, par sous-requêtes scalaires
+TOTALS_SQL = """
+    SELECT (SELECT COUNT(*) FROM user) AS total_users,
+           (SELECT COUNT(*) FROM recipes) AS total_recipes,
+           (SELECT COUNT(*) FROM comments) AS total_comments,
+           (SELECT COUNT(*) FROM ingredient_type) AS total_ingredients,
+           (SELECT COUNT(*) FROM favourites) AS total_favourites
+"""
+
+RECENT_RECIPES_SQL = """
+    SELECT r.id, r.title, u.username, r.added, r.author_grade
+    FROM recipes r
+    JOIN user u ON r.author_id = u.id
+    ORDER BY r.added DESC
+    LIMIT 10
+"""
+
+RECENT_COMMENTS_SQL = """
+    SELECT c.id, c.comment, u.username, c.grade, r.title, c.recipe_id
+    FROM comments c
+    JOIN user u ON c.author_id = u.id
+    JOIN recipes r ON c.recipe_id = r.id
+    ORDER BY c.id DESC
+    LIMIT 10
+"""
+
+# Note moyenne des commentaires, via idx_recipe_stats_avg_grade
+TOP_RECIPES_SQL = """
+    SELECT r.id, r.title, u.username, r.author_grade,
+           s.comment_count, s.avg_grade, s.favourite_count
+    FROM recipe_stats s
+    JOIN recipes r ON r.id = s.recipe_id
+    JOIN user u ON r.author_id = u.id
+    ORDER BY s.avg_grade DESC, s.comment_count DESC
+    LIMIT 10
+"""
+
+# Recettes et commentaires sont comptés séparément (parcours des index
+# idx_recipes_author et idx_comments_author) puis joints aux utilisateurs :
+# une double jointure multiplierait les lignes (recettes x commentaires)
+ACTIVE_USERS_SQL = """
+    WITH recipe_counts AS (
+        SELECT author_id, COUNT(*) AS n FROM recipes GROUP BY author_id
+    ), comment_counts AS (
+        SELECT author_id, COUNT(*) AS n FROM comments GROUP BY author_id
+    )
+    SELECT u.id, u.username,
+           COALESCE(rc.n, 0) AS recipe_count,
+           COALESCE(cc.n, 0) AS comment_count
+    FROM user u
+    LEFT JOIN recipe_counts rc ON rc.author_id = u.id
+    LEFT JOIN comment_counts cc ON cc.author_id = u.id
+    ORDER BY recipe_count + comment_count DESC
+    LIMIT 10
+"""
+
+RECIPES_BY_DIFFICULTY_SQL = """
+    SELECT difficulty, COUNT(*) as count
+    FROM recipes
+    GROUP BY difficulty
+    ORDER BY difficulty
+"""
+
+AVG_RATING_SQL = "SELECT AVG(author_grade) as avg_rating FROM recipes"
+
+# À partir des agrégats par recette (recipe_stats)
+COMMENTS_STATS_SQL = """
+    SELECT
+        CAST(SUM(grade_sum) AS REAL) / NULLIF(SUM(comment_count), 0) as avg_grade,
+        COALESCE(SUM(comment_count), 0) as total,
+        (SELECT MAX(grade) FROM comments) as max_grade,
+        (SELECT MIN(grade) FROM comments) as min_grade
+    FROM recipe_stats
+"""
+
+
+# Début de période d'un jour : lui-même, ou le lundi de sa semaine
+ACTIVITY_PERIOD_SQL = {
+    'day': "day",
+    'week': "date(day, 'weekday 0', '-6 days')",
+}
+
+# Lecture de la clé primaire (metric, day) : une plage par métrique
+ACTIVITY_SQL = """
+    SELECT metric, {period} AS period, SUM(count) AS count
+    FROM activity_daily
+    WHERE metric IN ({metrics}) AND day BETWEEN ? AND ?
+    GROUP BY metric, period
+"""
+
+
+def _rows(db, sql):
+    # Dictionnaires sérialisables en JSON (cache sur disque), dates en texte
+    return [
+        {key: value.isoformat(sep=' ') if hasattr(value, 'isoformat') else value
+         for key, value in dict(row).items()}
+        for row in db.execute(sql).fetchall()
+    ]
+
+
+def compute_dashboard_stats(db):
+    """
+    Calcule les statistiques du tableau de bord admin
+
+    Returns:
+        dict: stats (compteurs), recent_recipes, recent_comments,
+        top_recipes, active_users
+    """
+    return {
+        'stats': _rows(db, TOTALS_SQL)[0],
+        'recent_recipes': _rows(db, RECENT_RECIPES_SQL),
+        'recent_comments': _rows(db, RECENT_COMMENTS_SQL),
+        'top_recipes': _rows(db, TOP_RECIPES_SQL),
+        'active_users': _rows(db, ACTIVE_USERS_SQL),
+    }
+
+
+def compute_detail_stats(db):
+    """Statistiques détaillées de /admin/stats/api"""
+    return {
+        'recipes_by_difficulty': _rows(db, RECIPES_BY_DIFFICULTY_SQL),
+        'avg_recipe_rating': _rows(db, AVG_RATING_SQL)[0],
+        'comments_stats': _rows(db, COMMENTS_STATS_SQL)[0],
+    }
+
+
+def cached_stats(db, name, tables, compute):
+    """
+    Statistiques name, recalculées au plus une fois par écriture et par TTL
+
+    L'entrée en cache (app.cache) porte la version des tables dont elle
+    dépend (data_versions) : toute écriture dans l'une d'elles la rend
+    périmée sans invalidation explicite. ADMIN_STATS_TTL borne en plus sa
+    durée de vie.
+
+    Returns:
+        tuple: (statistiques, version, date de la dernière écriture)
+    """
+    version, last_modified = data_version(db, *tables)
+    if not current_app.config['PAGE_CACHE']:
+        return compute(db), version, last_modified
+
+    cache = get_page_cache()
+    key = ('admin-stats', name)
+    entry = cache.get(key)
+    if entry is None or entry['version'] != version:
+        entry = {'version': version, 'stats': compute(db)}
+        cache.set(key, entry, current_app.config['ADMIN_STATS_TTL'])
+    return entry['stats'], version, last_modified
+
+
+def dashboard_stats(db):
+    return cached_stats(db, 'dashboard', DASHBOARD_TABLES, compute_dashboard_stats)
+
+
+def detail_stats(db):
+    return cached_stats(db, 'detail', DETAIL_TABLES, compute_detail_stats)
+
+
+def activity_periods(start, end, bucket):
+    """Débuts des périodes (jours ou lundis) qui couvrent start..end"""
+    if bucket == 'week':
+        start -= timedelta(days=start.weekday())
+        step = timedelta(weeks=1)
+    else:
+        step = timedelta(days=1)
+    periods = []
+    while start <= end:
+        periods.append(start.isoformat())
+        start += step
+    return periods
+
+
+def activity_series(db, start, end, bucket='day', metrics=ACTIVITY_METRICS):
+    """
+    Ajouts par jour ou par semaine, lus dans le cumul activity_daily
+
+    Le cumul est tenu à jour par les triggers *_activity_insert : la
+    requête ne parcourt que les lignes de la période, jamais les tables
+    recipes, comments, favourites ou user.
+
+    Args:
+        start, end: Premier et dernier jour (date), inclus
+        bucket: 'day' ou 'week' (semaines du lundi au dimanche)
+        metrics: Métriques de ACTIVITY_METRICS à renvoyer
+
+    Returns:
+        dict: periods (débuts de période, ISO) et series (métrique -> un
+        compte par période, 0 sans activité)
+    """
+    periods = activity_periods(start, end, bucket)
+    index = {period: i for i, period in enumerate(periods)}
+    series = {metric: [0] * len(periods) for metric in metrics}
+
+    rows = db.execute(
+        ACTIVITY_SQL.format(period=ACTIVITY_PERIOD_SQL[bucket],
+                            metrics=', '.join('?' for _ in metrics)),
+        (*metrics, start.isoformat(), end.isoformat())
+    ).fetchall()
+    for row in rows:
+        series[row['metric']][index[row['period']]] = row['count']
+    return {'bucket': bucket, 'periods': periods, 'series': series}
+
+
+def parse_activity_args(args, today=None):
+    """
+    Lit start, end, bucket et metrics d'une requête de séries
+
+    Par défaut, les 30 derniers jours (UTC, comme activity_daily), par
+    jour, pour toutes les métriques.
+
+    Returns:
+        tuple: (start, end, bucket, metrics)
+
+    Raises:
+        ValueError: Date, période ou métrique invalide
+    """
+    today = today or datetime.now(timezone.utc).date()
+    end = date.fromisoformat(args['end']) if args.get('end') else today
+    start = date.fromisoformat(args['start']) if args.get('start') else end - timedelta(days=29)
+    if start > end or (end - start).days >= ACTIVITY_MAX_DAYS:
+        raise ValueError(f"Période invalide (au plus {ACTIVITY_MAX_DAYS} jours)")
+
+    bucket = args.get('bucket') or 'day'
+    if bucket not in ACTIVITY_BUCKETS:
+        raise ValueError(f"Période de regroupement inconnue : {bucket}")
+
+    metrics = tuple(args['metrics'].split(',')) if args.get('metrics') else ACTIVITY_METRICS
+    unknown = set(metrics) - set(ACTIVITY_METRICS)
+    if unknown:
+        raise ValueError(f"Métriques inconnues : {', '.join(sorted(unknown))}")
+    return start, end, bucket, metrics
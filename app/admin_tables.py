@@ -0,0 +1,113 @@
+from collections import namedtuple
+
+from app.search import decode_cursor, encode_cursor
+
+ADMIN_PAGE_SIZE = 50
+
+# Une liste de gestion de l'administration :
+#   select, from_sql : colonnes et tables (id_sql est la clé unique de départage)
+#   search : colonne filtrée par la recherche (LIKE '%q%')
+#   sorts : tri proposé -> colonne, chacune couverte par un index avec id_sql
+#   default_sort : (tri, décroissant) par défaut
+AdminList = namedtuple('AdminList', 'select from_sql id_sql search sorts default_sort')
+
+ADMIN_LISTS = {
+    # Les compteurs ne sont calculés que pour les lignes de la page, par
+    # sous-requêtes sur idx_recipes_author et idx_comments_author
+    'users': AdminList(
+        select="""u.id, u.username, COALESCE(u.is_admin, 0) AS is_admin,
+                  (SELECT COUNT(*) FROM recipes r WHERE r.author_id = u.id) AS recipe_count,
+                  (SELECT COUNT(*) FROM comments c WHERE c.author_id = u.id) AS comment_count""",
+        from_sql="user u",
+        id_sql="u.id",
+        search="u.username",
+        sorts={'username': "u.username", 'id': "u.id"},
+        default_sort=('username', False),
+    ),
+    'recipes': AdminList(
+        select="r.id, r.title, r.added, r.author_grade, u.username",
+        from_sql="recipes r JOIN user u ON u.id = r.author_id",
+        id_sql="r.id",
+        search="r.title",
+        sorts={'added': "r.added", 'title': "r.title"},
+        default_sort=('added', True),
+    ),
+    'comments': AdminList(
+        select="c.id, c.comment, c.grade, c.recipe_id, u.username, r.title",
+        from_sql="comments c JOIN user u ON u.id = c.author_id JOIN recipes r ON r.id = c.recipe_id",
+        id_sql="c.id",
+        search="u.username",
+        sorts={'id': "c.id", 'grade': "c.grade"},
+        default_sort=('id', True),
+    ),
+}
+
+
+def _like_pattern(q):
+    # Les jokers tapés par l'utilisateur sont cherchés tels quels
+    escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _as_dict(row):
+    # Sérialisable en JSON, dates en texte
+    return {key: value.isoformat(sep=' ') if hasattr(value, 'isoformat') else value
+            for key, value in dict(row).items()}
+
+
+def list_page(db, name, q='', sort=None, order=None, cursor=None, limit=ADMIN_PAGE_SIZE):
+    """
+    Une page d'une liste de gestion de l'administration
+
+    Pagination par curseur (keyset) sur (colonne de tri, id) : chaque page
+    est une lecture d'index de limit lignes, quelle que soit sa profondeur.
+
+    Args:
+        name: Clé de ADMIN_LISTS
+        q: Filtre sur le nom d'utilisateur ou le titre
+        sort: Clé de tri de la liste, le tri par défaut si inconnue
+        order: 'asc' ou 'desc', l'ordre par défaut du tri si absent
+        cursor: Curseur renvoyé par la page précédente
+
+    Returns:
+        tuple: (lignes en dictionnaires, curseur suivant ou None)
+    """
+    spec = ADMIN_LISTS[name]
+    if sort not in spec.sorts:
+        sort, descending = spec.default_sort
+    else:
+        descending = order == 'desc' if order in ('asc', 'desc') else spec.default_sort[1]
+    sort_sql = spec.sorts[sort]
+
+    conditions, params = [], []
+    if q:
+        conditions.append(f"{spec.search} LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(q))
+
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        sort_key, last_id = position[:2]
+        conditions.append(f"({sort_sql}, {spec.id_sql}) {'<' if descending else '>'} (?, ?)")
+        params += [sort_key, last_id]
+
+    direction = 'DESC' if descending else 'ASC'
+    rows = db.execute(
+        f"""SELECT {spec.select}, {sort_sql} AS sort_key
+            FROM {spec.from_sql}
+            WHERE {' AND '.join(conditions) or '1'}
+            ORDER BY {sort_sql} {direction}, {spec.id_sql} {direction}
+            LIMIT ?""", (*params, limit + 1)
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # Pas de total compté ici : 0 et False pour le format de decode_cursor
+        next_cursor = encode_cursor(rows[-1]['sort_key'], rows[-1]['id'], 0, False)
+
+    items = []
+    for row in rows:
+        item = _as_dict(row)
+        del item['sort_key']
+        items.append(item)
+    return items, next_cursor
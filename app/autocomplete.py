@@ -0,0 +1,173 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+from flask import current_app
+
+from app.db import data_version
+
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 20
+# Au-delà de ce nombre de clés correspondantes, les meilleurs résultats
+# d'un préfixe sont gardés jusqu'à la prochaine mise à jour de l'index
+RANGE_SCAN_LIMIT = 1000
+
+WORD_RE = re.compile(r'\w+')
+# Ligatures que la décomposition NFKD laisse entières : "oeuf" doit trouver "œuf"
+LIGATURES = str.maketrans({'œ': 'oe', 'Œ': 'OE', 'æ': 'ae', 'Æ': 'AE'})
+
+
+def fold(text):
+    """
+    Forme de comparaison de l'autocomplétion
+
+    Sans accents, ligatures ni casse, espaces normalisés : "Crème  Fraîche"
+    et "creme fraiche" ont la même forme, "Œuf" et "oeuf" aussi.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.translate(LIGATURES))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+def _keys(name):
+    # Le nom à partir de chacun de ses mots : "huile d'olive" est trouvé
+    # par "hu", "d" et "ol"
+    folded = fold(name)
+    return {folded[match.start():] for match in WORD_RE.finditer(folded)}
+
+
+def _after(prefix):
+    # Plus petite chaîne supérieure à toutes celles qui commencent par prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class IngredientIndex:
+    """
+    Index en mémoire des types d'ingrédient pour l'autocomplétion
+
+    Une liste triée de (clé, id), parcourue par recherche dichotomique : un
+    préfixe correspond à une tranche contiguë de la liste. Les résultats
+    sont classés par nombre d'utilisations dans les recettes (rang entier
+    précalculé). Les préfixes courts, qui correspondent à une grande
+    tranche, gardent leurs meilleurs résultats en mémoire.
+
+    La liste, les rangs et les meilleurs résultats en mémoire forment une
+    génération, publiée d'un bloc (_generation) : une recherche lit une
+    seule génération du début à la fin et ne garde ses résultats que dans
+    le cache de celle-ci, jamais dans celui d'un index reconstruit entre-temps.
+
+    L'index est propre au processus. Il est construit à la première
+    requête, complété des types créés depuis (version de la table
+    ingredient_type, y compris par un autre worker) et reconstruit
+    entièrement toutes les ttl secondes pour rafraîchir les compteurs
+    d'utilisation, ou dès qu'un type a été renommé ou supprimé
+    (ingredient_type_edits) : la liste ne peut alors pas être simplement
+    complétée.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        # (liste triée, noms, rangs, meilleurs résultats par préfixe)
+        self._generation = ([], {}, {}, {})
+        self._names = {}
+        self._usage = {}
+        self._last_id = 0
+        self._version = None
+        self._edits = None
+        self._built = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, db):
+        """Met l'index à jour si ingredient_type a changé ou si le ttl est écoulé"""
+        version, _ = data_version(db, 'ingredient_type')
+        if version == self._version and time.time() - self._built < self.ttl:
+            return
+        with self._lock:
+            edits, _ = data_version(db, 'ingredient_type_edits')
+            expired = time.time() - self._built >= self.ttl
+            if expired or edits != self._edits:
+                self._build(db, version)
+            elif version != self._version and not self._add_new(db, version):
+                self._build(db, version)
+            self._edits = edits
+
+    def _build(self, db, version):
+        names = {row['id']: row['name'] for row in db.execute('SELECT id, name FROM ingredient_type')}
+        # Parcours de idx_ingredients_type
+        usage = dict(db.execute(
+            'SELECT ingredient_id, COUNT(*) FROM ingredients GROUP BY ingredient_id'
+        ).fetchall())
+        keys = sorted((key, ingredient_id) for ingredient_id, name in names.items() for key in _keys(name))
+
+        self._names, self._usage = names, usage
+        self._publish(keys)
+        self._last_id = max(names, default=0)
+        self._version, self._built = version, time.time()
+
+    def _publish(self, keys):
+        # Le plus utilisé d'abord, puis le nom le plus court
+        def order(ingredient_id):
+            name = self._names[ingredient_id]
+            return -self._usage.get(ingredient_id, 0), len(name), name
+        rank = {ingredient_id: i for i, ingredient_id in enumerate(sorted(self._names, key=order))}
+        self._generation = (keys, self._names, rank, {})
+
+    def _add_new(self, db, version):
+        # False si la table ne se résume pas à l'index plus des ids ajoutés
+        # à la suite (suppression hors trigger, base restaurée...)
+        count, max_id = db.execute('SELECT COUNT(*), MAX(id) FROM ingredient_type').fetchone()
+        rows = db.execute(
+            'SELECT id, name FROM ingredient_type WHERE id > ? AND id <= ? ORDER BY id',
+            (self._last_id, max_id or 0)
+        ).fetchall()
+        if count != len(self._names) + len(rows):
+            return False
+        # Nouvelle liste plutôt qu'insertion sur place : les lectures en
+        # cours dans d'autres threads gardent une liste cohérente
+        keys = list(self._generation[0])
+        for row in rows:
+            self._names[row['id']] = row['name']
+            for key in _keys(row['name']):
+                bisect.insort(keys, (key, row['id']))
+            self._last_id = row['id']
+        self._publish(keys)
+        self._version = version
+        return True
+
+    def suggest(self, query, limit=SUGGEST_LIMIT):
+        """
+        Les ingrédients dont un mot commence par query
+
+        Args:
+            query: Début de nom, sans importance des accents et de la casse
+            limit: Nombre de résultats, au plus SUGGEST_MAX_LIMIT
+
+        Returns:
+            list: dicts id, name, du plus utilisé au moins utilisé (puis
+            du nom le plus court au plus long)
+        """
+        prefix = fold(query)
+        if not prefix:
+            return []
+
+        keys, names, rank, frequent = self._generation
+        top = frequent.get(prefix)
+        if top is None:
+            start = bisect.bisect_left(keys, (prefix,))
+            end = bisect.bisect_left(keys, (_after(prefix),), lo=start)
+            matches = {ingredient_id for _, ingredient_id in keys[start:end]}
+            top = heapq.nsmallest(SUGGEST_MAX_LIMIT, matches, key=rank.__getitem__)
+            if end - start > RANGE_SCAN_LIMIT:
+                frequent[prefix] = top
+        return [{'id': ingredient_id, 'name': names[ingredient_id]} for ingredient_id in top[:limit]]
+
+
+def get_ingredient_index():
+    return current_app.extensions['ingredient_index']
+
+
+def init_app(app):
+    app.extensions['ingredient_index'] = IngredientIndex(app.config['INGREDIENT_INDEX_TTL'])
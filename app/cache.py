@@ -0,0 +1,180 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+
+from flask import current_app, request, session
+from markupsafe import Markup
+
+
+class PageCache:
+    """
+    Cache de fragments HTML rendus
+
+    Les entrées sont gardées dans un LRU en mémoire, propre au processus.
+    Si un dossier est configuré (PAGE_CACHE_DIR), elles sont aussi écrites
+    sur disque pour être partagées entre les workers gunicorn.
+
+    Une clé est un tuple, par exemple ('recipe', 12, 3). Son préfixe sert
+    à invalider d'un coup toutes les entrées d'une recette, en mémoire et
+    sur disque (un dossier par préfixe).
+    """
+
+    def __init__(self, max_entries=512, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires, value = item
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.directory:
+            try:
+                with open(self._path(key), encoding='utf8') as f:
+                    expires, value = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if expires is None or expires > now:
+                self._remember(key, value, expires)
+                return value
+        return None
+
+    def set(self, key, value, ttl=None):
+        """Enregistre value (sérialisable en JSON), pour ttl secondes si précisé"""
+        expires = time.time() + ttl if ttl else None
+        self._remember(key, value, expires)
+
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Écriture atomique : un autre worker ne lit jamais un fichier partiel
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf8') as f:
+                    json.dump([expires, value], f)
+                os.replace(tmp_path, path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def invalidate(self, *prefix):
+        """Supprime toutes les entrées dont la clé commence par prefix"""
+        with self._lock:
+            for key in [k for k in self._entries if k[:len(prefix)] == prefix]:
+                del self._entries[key]
+
+        if self.directory:
+            path = os.path.join(self.directory, *map(str, prefix))
+            shutil.rmtree(path, ignore_errors=True)
+            if os.path.exists(path + '.json'):
+                os.remove(path + '.json')
+
+    def _remember(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, *map(str, key)) + '.json'
+
+
+def get_page_cache():
+    return current_app.extensions['page_cache']
+
+
+def cached(key, build, ttl=None):
+    """Renvoie l'entrée key du cache, en la calculant avec build() si absente"""
+    if not current_app.config['PAGE_CACHE']:
+        return build()
+
+    cache = get_page_cache()
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, ttl)
+    return value
+
+
+def fill_slots(html, slots):
+    """Remplace chaque <!--slot:nom--> d'un fragment en cache par slots[nom]"""
+    for name, value in slots.items():
+        html = html.replace(f'<!--slot:{name}-->', str(value))
+    return Markup(html)
+
+
+def not_modified(etag, last_modified=None):
+    """
+    Réponse 304 si le client possède déjà cette version, None sinon
+
+    À appeler avant tout rendu : une revalidation réussie ne coûte ni
+    template ni sérialisation JSON. If-None-Match prime sur
+    If-Modified-Since. Une page qui a un message flash en attente est
+    toujours renvoyée en entier.
+    """
+    if '_flashes' in session:
+        return None
+
+    last_modified = _as_utc(last_modified)
+    if request.if_none_match:
+        if not request.if_none_match.contains(etag):
+            return None
+    elif not (last_modified and request.if_modified_since
+              and last_modified <= request.if_modified_since):
+        return None
+
+    return add_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def add_validators(response, etag, last_modified=None, private=False):
+    """Ajoute ETag, Last-Modified et demande une revalidation à chaque utilisation"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _as_utc(last_modified)
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.vary.add('Cookie')
+    return response
+
+
+def _as_utc(value):
+    # Les dates SQLite (CURRENT_TIMESTAMP) sont en UTC, sans fuseau
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def invalidate_recipe(recipe_id):
+    """À appeler après chaque écriture qui change la page d'une recette"""
+    if current_app.config['PAGE_CACHE']:
+        get_page_cache().invalidate('recipe', recipe_id)
+
+
+def invalidate_home():
+    """À appeler après l'ajout ou la suppression d'une recette"""
+    if current_app.config['PAGE_CACHE']:
+        get_page_cache().invalidate('home')
+
+
+def init_app(app):
+    app.extensions['page_cache'] = PageCache(
+        max_entries=app.config['PAGE_CACHE_SIZE'],
+        directory=app.config['PAGE_CACHE_DIR'],
+    )
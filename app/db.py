@@ -1,16 +1,63 @@
+import os
 import sqlite3
+import threading
 from datetime import datetime
 
 import click
 from flask import current_app, g
 
+from app.ingredients import normalize_name
+
+# Connexions inactives du processus courant, par base. Une requête en prend
+# une (avec son cache de pages déjà chaud) et la rend à la fin ; au-delà de
+# DB_POOL_SIZE elle est fermée. Le pool ne dépend pas des threads : ceux que
+# créent le serveur de développement ou un worker gthread peuvent se
+# terminer sans laisser de connexion (ni de lecteur WAL) ouverte.
+_pool = {}
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _connect(config):
+    db = sqlite3.connect(
+        config['DATABASE'],
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=config['SQLITE_BUSY_TIMEOUT'],
+        # Une connexion du pool sert des threads successifs, jamais deux à la fois
+        check_same_thread=False,
+    )
+    db.row_factory = sqlite3.Row
+    # Utilisable dans les migrations pour recalculer les colonnes normalisées
+    db.create_function('normalize_name', 1, normalize_name, deterministic=True)
+
+    # WAL : les lectures ne sont plus bloquées par une écriture en cours
+    db.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+    db.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+    db.execute(f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}")
+    db.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+    db.execute(f"PRAGMA temp_store = {config['SQLITE_TEMP_STORE']}")
+    return db
+
+
+def _idle_connections(database):
+    # Après un fork, les connexions héritées du parent ne doivent pas être
+    # réutilisées (ni fermées : elles appartiennent au parent)
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        _pool, _pool_pid = {}, os.getpid()
+    return _pool.setdefault(database, [])
+
+
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        config = current_app.config
+        db = None
+        if config['DB_POOL']:
+            with _pool_lock:
+                idle = _idle_connections(config['DATABASE'])
+                if idle:
+                    db = idle.pop()
+        g.db = db or _connect(config)
 
     return g.db
 
@@ -18,9 +65,66 @@ def get_db():
 def close_db(e=None):
     db = g.pop('db', None)
 
-    if db is not None:
-        db.close()
-        print("Closed the database")
+    if db is None:
+        return
+
+    config = current_app.config
+    if config['DB_POOL']:
+        # La connexion retourne dans le pool : on abandonne ce qui n'a pas été commité
+        if db.in_transaction:
+            db.rollback()
+        with _pool_lock:
+            idle = _idle_connections(config['DATABASE'])
+            if len(idle) < config['DB_POOL_SIZE']:
+                idle.append(db)
+                return
+    db.close()
+
+
+# Nouvelle version d'une recette : à ajouter à l'UPDATE qui la modifie
+RECIPE_VERSION_SQL = "version = version + 1, updated = CURRENT_TIMESTAMP"
+
+
+def touch_recipes(db, condition, params=()):
+    """
+    Incrémente version et updated des recettes qui vérifient condition
+
+    À appeler une fois par écriture, dans sa transaction, quand les lignes
+    enfants d'une recette (ingrédients, étapes, commentaires) changent sans
+    que la recette elle-même soit modifiée.
+
+    Args:
+        condition: Clause WHERE sur recipes, ex. "id = ?"
+    """
+    db.execute(f"UPDATE recipes SET {RECIPE_VERSION_SQL} WHERE {condition}", params)
+
+
+def data_version(db, *names):
+    """
+    État des tables names d'après data_versions (tenue à jour par triggers)
+
+    Returns:
+        tuple: (version, updated) où version est une chaîne qui change à
+        chaque écriture dans l'une des tables et updated la date de la
+        plus récente
+    """
+    placeholders = ', '.join('?' for _ in names)
+    rows = db.execute(
+        f"SELECT name, version, updated FROM data_versions WHERE name IN ({placeholders}) ORDER BY name",
+        names
+    ).fetchall()
+    version = '-'.join(str(row['version']) for row in rows)
+    return version, max((row['updated'] for row in rows), default=None)
+
+
+def list_migrations():
+    """Migrations livrées avec l'application : [(version, nom de fichier)] triées"""
+    folder = os.path.join(current_app.root_path, 'migrations')
+    migrations = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.sql'):
+            migrations.append((int(name.split('_', 1)[0]), name))
+    return migrations
 
 
 def init_db():
@@ -29,11 +133,39 @@ def init_db():
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
 
-def modify_db():
+    # schema.sql contient déjà toutes les migrations
+    migrations = list_migrations()
+    db.execute(f"PRAGMA user_version = {migrations[-1][0] if migrations else 0}")
+
+
+def migrate_db():
+    """
+    Applique, dans l'ordre, les migrations plus récentes que la base
+
+    La version de la base est stockée dans PRAGMA user_version. Chaque
+    migration est appliquée dans sa propre transaction avec la mise à jour
+    de la version : une migration qui échoue ne laisse rien derrière elle.
+
+    Returns:
+        list: Noms des migrations appliquées
+    """
     db = get_db()
+    current = db.execute('PRAGMA user_version').fetchone()[0]
 
-    with current_app.open_resource('modify.sql') as f:
-        db.executescript(f.read().decode('utf8'))
+    applied = []
+    for version, name in list_migrations():
+        if version <= current:
+            continue
+        with current_app.open_resource(f'migrations/{name}') as f:
+            script = f.read().decode('utf8')
+        try:
+            db.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        applied.append(name)
+    return applied
 
 @click.command('init-db')
 def init_db_command():
@@ -41,11 +173,13 @@ def init_db_command():
     init_db()
     click.echo('Initialized the database.')
 
-@click.command('modify-db')
-def modify_db_command():
-    """Apply modifications to the database schema."""
-    modify_db()
-    click.echo('Modified the database schema.')
+@click.command('migrate-db')
+def migrate_db_command():
+    """Apply pending schema migrations without touching existing data."""
+    applied = migrate_db()
+    for name in applied:
+        click.echo(f'Applied {name}')
+    click.echo('The database schema is up to date.')
 
 sqlite3.register_converter(
     "timestamp", lambda v: datetime.fromisoformat(v.decode())
@@ -54,4 +188,4 @@ sqlite3.register_converter(
 def init_app(app):
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
-    app.cli.add_command(modify_db_command)
\ No newline at end of file
+    app.cli.add_command(migrate_db_command)
@@ -1,78 +1,563 @@
+import glob
+import hashlib
+import heapq
+import json
+import logging
 import os
-import uuid
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app, g, request, url_for
+from app.db import get_db, touch_recipes
 from werkzeug.utils import secure_filename
 from PIL import Image
 from app import UPLOAD_FOLDER
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_SIZE = (1024, 1024)  # Taille maximale pour optimisation
+# Budget de décodage : au-delà, l'image est refusée dès la lecture de son
+# en-tête (40 Mpx, soit 160 Mo en RGBA au pire avant réduction)
+MAX_IMAGE_PIXELS = 40_000_000
+MAX_IMAGE_DIMENSION = 12_000
+
+# Les images sont rangées par contenu : objects/<2 premiers caractères>/<sha256>.<ext>.
+# Un même fichier envoyé deux fois n'est stocké et traité qu'une fois, et son
+# URL ne change jamais de contenu (servie avec Cache-Control: immutable).
+OBJECTS_FOLDER = 'objects'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Marque des fichiers bruts en attente d'optimisation : <sha256>.pending.<ext>
+PENDING_MARK = '.pending.'
+PLACEHOLDER_IMAGE = 'images/image-processing.svg'
+
+# Largeurs des variantes générées pour chaque image, de la vignette à l'image
+# pleine page. Chacune est écrite à côté de l'image : <sha256>.<largeur>w.<format>
+IMAGE_VARIANTS = {'thumb': 320, 'card': 640, 'full': MAX_SIZE[0]}
+
+# Formats modernes des variantes, du plus compact au plus répandu ; ceux que
+# l'installation de Pillow ne sait pas écrire sont ignorés
+VARIANT_FORMATS = [
+    ('avif', 'image/avif', {'quality': 55}),
+    ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+]
+
+# Nettoyage des fichiers orphelins (gc-uploads) : fichiers examinés par
+# lancement, et âge minimal d'un fichier pour être supprimé (un envoi dont la
+# transaction n'est pas encore validée n'a pas encore de référence)
+GC_BATCH_SIZE = 1000
+GC_MIN_AGE = 3600
+GC_CURSOR_FILE = 'gc-uploads.cursor'
+
+# Reconstruit la table images à partir des colonnes image_url
+REBUILD_IMAGE_REFS_SQL = """
+    DELETE FROM images;
+    INSERT INTO images (url, refcount)
+    SELECT image_url, COUNT(*) FROM (
+      SELECT image_url FROM recipes WHERE image_url IS NOT NULL
+      UNION ALL
+      SELECT image_url FROM comments WHERE image_url IS NOT NULL
+    )
+    GROUP BY image_url;
+"""
+
+# Nommé : process_upload tourne hors de tout contexte d'application (pool de
+# processus), où current_app.logger n'est pas disponible
+logger = logging.getLogger(__name__)
+
+# Pool de processus propre à chaque worker gunicorn, créé à la première utilisation
+_executor = None
+_executor_pid = None
+
+# Images existantes réutilisées par une requête en cours de ce processus,
+# par chemin : leur référence n'existe qu'au commit, d'ici là ni
+# finish_request ni is_referenced ne doivent les tenir pour orphelines
+_pinned = Counter()
+_pinned_lock = threading.Lock()
 
 def allowed_file(filename):
     """Vérifie si le fichier est autorisé"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def check_image_header(stream):
+    """
+    Vérifie une image envoyée sans la décoder
+
+    Seul l'en-tête est lu : le format doit être reconnu par Pillow et les
+    dimensions rester dans MAX_IMAGE_DIMENSION et MAX_IMAGE_PIXELS.
+
+    Returns:
+        bool: True si l'image peut être traitée
+    """
+    try:
+        with Image.open(stream) as img:
+            width, height = img.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return False
+    finally:
+        stream.seek(0)
+    return (max(width, height) <= MAX_IMAGE_DIMENSION
+            and width * height <= MAX_IMAGE_PIXELS)
+
 def save_image(file, upload_folder, optimize=True):
     """
-    Sauvegarde une image avec un nom unique
-    
+    Sauvegarde une image sous le nom de son empreinte SHA-256
+
+    Si ce contenu a déjà été envoyé, le fichier existant est réutilisé sans
+    rien écrire ni traiter ; il est épinglé jusqu'à la fin de la requête
+    (voir _pin) et rétabli depuis l'envoi s'il a été supprimé avant le
+    commit. Sinon, avec optimize, le fichier est enregistré
+    brut et l'URL renvoyée est celle d'un fichier "en attente".
+    L'optimisation est faite en arrière-plan une fois la requête terminée
+    (voir finish_request) : le fichier final remplace alors le brut et
+    image_url est mis à jour en base.
+
     Args:
         file: Le fichier uploadé (FileStorage)
-        upload_folder: Dossier de destination (ex: 'recipes' ou 'comments')
+        upload_folder: Conservé pour compatibilité ; toutes les images
+            partagent désormais le dossier OBJECTS_FOLDER
         optimize: Si True, optimise et redimensionne l'image
-    
+
     Returns:
-        str: Chemin relatif de l'image sauvegardée ou None si erreur
+        str: Chemin relatif de l'image sauvegardée, ou None si le fichier
+        n'est pas une image acceptée (extension, format, dimensions)
     """
-    if file and allowed_file(file.filename):
-        # Générer un nom unique
+    if file and allowed_file(file.filename) and check_image_header(file.stream):
         ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{uuid.uuid4()}.{ext}"
-        
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+            digest.update(chunk)
+        file.stream.seek(0)
+        name = digest.hexdigest()
+
         # Chemin complet
-        folder_path = os.path.join('app', UPLOAD_FOLDER, upload_folder)
+        folder = f"{UPLOAD_FOLDER}/{OBJECTS_FOLDER}/{name[:2]}"
+        folder_path = os.path.join('app', folder)
         os.makedirs(folder_path, exist_ok=True)
-        filepath = os.path.join(folder_path, filename)
-        
-        if optimize:
-            try:
-                # Ouvrir l'image avec Pillow
-                img = Image.open(file)
-                
-                # Convertir en RGB si nécessaire (pour les PNG avec transparence)
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                
-                # Redimensionner si trop grand
-                img.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
-                
-                # Sauvegarder avec compression
-                img.save(filepath, optimize=True, quality=85)
-                
-            except Exception as e:
-                print(f"Erreur lors de l'optimisation de l'image: {e}")
-                # Sauvegarder sans optimisation en cas d'erreur
-                file.seek(0)
-                file.save(filepath)
-        else:
-            file.save(filepath)
-        
+        final_path = os.path.join(folder_path, f"{name}.{ext}")
+        final_url = f"../{folder}/{name}.{ext}"
+
+        pending_path = os.path.join(folder_path, f"{name}{PENDING_MARK}{ext}")
+        pending_url = f"../{folder}/{name}{PENDING_MARK}{ext}"
+        job = (current_app.config['DATABASE'], pending_path, final_path, pending_url, final_url)
+
+        if _pin(final_path):
+            g.setdefault('reused_images', []).append((file, job))
+            return final_url
+        if not optimize:
+            _save_upload(file, final_path)
+            return final_url
+
+        if not os.path.exists(pending_path):
+            _save_upload(file, pending_path)
+
+        # Même si le brut existait déjà (envoi simultané du même fichier),
+        # un traitement est planifié : il publie l'image pour les lignes de
+        # cette requête si l'autre traitement est déjà terminé
+        g.setdefault('pending_images', []).append(job)
+
         # Retourner le chemin relatif pour la base de données
-        return f"../{UPLOAD_FOLDER}/{upload_folder}/{filename}"
-    
+        return pending_url
+
     return None
 
-def delete_image(image_url):
-    """Supprime une image du serveur"""
-    filepath = image_url.replace('../', 'app/')
-    if filepath:
+def _pin(final_path):
+    """
+    Épingle une image existante pour la requête en cours
+
+    Dans ce processus, l'épingle empêche sa suppression par finish_request.
+    Pour gc-uploads, lancé à part, la date du fichier et de ses variantes
+    est remise à maintenant : il ne supprime que les fichiers plus vieux
+    que GC_MIN_AGE.
+
+    Returns:
+        bool: False si le fichier n'existe pas ou vient d'être supprimé
+    """
+    with _pinned_lock:
+        _pinned[final_path] += 1
+    try:
+        os.utime(final_path)
+        for variant in glob.glob(glob.escape(final_path.rsplit('.', 1)[0]) + '.*w.*'):
+            os.utime(variant)
+        return True
+    except FileNotFoundError:
+        _unpin(final_path)
+        return False
+
+def _unpin(final_path):
+    with _pinned_lock:
+        _pinned[final_path] -= 1
+        if _pinned[final_path] <= 0:
+            del _pinned[final_path]
+
+def _save_upload(file, destination):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix='.tmp-')
+    os.close(fd)
+    try:
+        file.save(tmp_path)
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def is_pending(image_url):
+    """Indique si l'image est encore en cours d'optimisation"""
+    return bool(image_url) and PENDING_MARK in image_url
+
+def image_src(image_url):
+    """Filtre Jinja : URL à afficher, une image d'attente tant que le traitement n'est pas fini"""
+    if is_pending(image_url):
+        return url_for('static', filename=PLACEHOLDER_IMAGE)
+    return image_url
+
+def variant_url(image_url, width, ext):
+    """URL (ou chemin) de la variante de largeur width au format ext"""
+    return f"{image_url.rsplit('.', 1)[0]}.{width}w.{ext}"
+
+def variant_formats():
+    Image.init()
+    return [fmt for fmt in VARIANT_FORMATS if fmt[0].upper() in Image.SAVE]
+
+def image_sources(image_url):
+    """
+    Filtre Jinja : (type MIME, srcset) pour chaque format de variantes
+
+    Renvoie une liste vide pour une image en attente ou enregistrée avant
+    l'introduction des variantes : seule l'image principale est alors utilisée.
+    """
+    if not image_url or is_pending(image_url):
+        return []
+    formats = variant_formats()
+    widths = sorted(IMAGE_VARIANTS.values())
+    if not formats or not os.path.exists(variant_url(image_url.replace('../', 'app/'), widths[-1], formats[-1][0])):
+        return []
+    return [
+        (mime, ', '.join(f"{variant_url(image_url, width, ext)} {width}w" for width in widths))
+        for ext, mime, _ in formats
+    ]
+
+def write_variants(img, destination):
+    """Écrit les variantes de img (déjà en RGB et réduite) à côté de destination"""
+    for width in sorted(IMAGE_VARIANTS.values(), reverse=True):
+        if img.width > width:
+            # Chaque variante est réduite à partir de la précédente, plus proche en taille
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+        for ext, _, options in variant_formats():
+            _save_atomic(img, variant_url(destination, width, ext), **options)
+
+def _save_atomic(img, destination, **options):
+    # Fichier temporaire de même extension que destination (Pillow en déduit
+    # le format) puis renommage : destination n'existe jamais à moitié écrite
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix='.tmp-',
+                                    suffix=os.path.splitext(destination)[1])
+    os.close(fd)
+    try:
+        img.save(tmp_path, **options)
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def optimize_image(source, destination):
+    """
+    Convertit en RGB, redimensionne et compresse source dans destination,
+    puis génère ses variantes (write_variants)
+
+    La mémoire utilisée reste bornée : les dimensions sont revérifiées avant
+    décodage, un JPEG est décodé directement à une échelle réduite (mode
+    draft de Pillow, réduction par la DCT) et la conversion en RGB se fait
+    après le redimensionnement.
+    """
+    img = Image.open(source)
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(f"Image trop grande : {img.width}x{img.height}")
+
+    # Décodage JPEG à 1/2, 1/4 ou 1/8 tant que le résultat reste au moins
+    # deux fois plus grand que MAX_SIZE (marge pour un redimensionnement net)
+    if img.format == 'JPEG':
+        scale = max(img.width / MAX_SIZE[0], img.height / MAX_SIZE[1], 1) / 2
+        img.draft('RGB', (max(1, int(img.width / scale)), max(1, int(img.height / scale))))
+
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+
+    # Redimensionner si trop grand
+    img.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    # Convertir en RGB si nécessaire (pour les PNG avec transparence)
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # Variantes d'abord : quand destination apparaît, elles existent toutes
+    write_variants(img, destination)
+
+    # Sauvegarder avec compression
+    _save_atomic(img, destination, optimize=True, quality=85)
+
+def publish_image(db, pending_url, final_url):
+    """
+    Remplace l'URL d'une image en attente dans les recettes et commentaires
+
+    Les recettes concernées, ou dont un commentaire l'est, changent de
+    version : leur page en cache montrait l'image d'attente. Avec final_url
+    à None (image refusée), les lignes n'ont plus d'image.
+    """
+    touch_recipes(db, "image_url = ? OR id IN (SELECT recipe_id FROM comments WHERE image_url = ?)",
+                  (pending_url, pending_url))
+    for table in ('recipes', 'comments'):
+        db.execute(f"UPDATE {table} SET image_url = ? WHERE image_url = ?", (final_url, pending_url))
+
+def process_upload(database, pending_path, final_path, pending_url, final_url):
+    """
+    Optimise une image en attente puis la publie
+
+    Exécutée dans un processus du pool : elle ouvre sa propre connexion à la
+    base. Si plus aucune ligne ne référence l'image (recette supprimée,
+    transaction annulée), le fichier produit est supprimé. Une image refusée
+    (DecompressionBombError) est retirée des lignes qui l'attendaient.
+    """
+    if os.path.exists(pending_path):
         try:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                return True
-        except Exception as e:
-            print(f"Erreur lors de la suppression de l'image: {e}")
-    return False
\ No newline at end of file
+            optimize_image(pending_path, final_path)
+        except Image.DecompressionBombError as e:
+            # Jamais publiée : l'URL d'attente ne mènerait plus à rien
+            logger.warning("Image refusée : %s", e)
+            os.remove(pending_path)
+            final_url = None
+        except Exception:
+            logger.exception("Erreur lors de l'optimisation de l'image")
+            # Publier le fichier sans optimisation en cas d'erreur
+            os.replace(pending_path, final_path)
+    elif not os.path.exists(final_path):
+        return
+
+    db = sqlite3.connect(database, timeout=30)
+    try:
+        with db:
+            publish_image(db, pending_url, final_url)
+            referenced = db.execute(
+                "SELECT 1 FROM images WHERE url IN (?, ?)", (final_url, pending_url)
+            ).fetchone()
+    finally:
+        db.close()
+
+    if not referenced:
+        _remove_files(final_path)
+    if os.path.exists(pending_path):
+        os.remove(pending_path)
+
+def get_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'])
+        _executor_pid = os.getpid()
+    return _executor
+
+def finish_request(e=None):
+    """
+    Supprime les images libérées puis envoie au pool celles enregistrées
+    pendant la requête
+
+    Appelée à la fin de la requête, donc après le commit : les lignes qui
+    référencent une nouvelle image sont visibles au processus de traitement,
+    et le compte de références des images libérées est définitif. Avec
+    IMAGE_WORKERS à 0, le traitement est fait sur place.
+    """
+    released = set(g.pop('released_images', []))
+    if released:
+        db = get_db()
+        # Transaction non validée (erreur) : elle sera annulée, les
+        # références aussi, et les fichiers doivent rester
+        if not db.in_transaction:
+            placeholders = ', '.join('?' for _ in released)
+            referenced = {row['url'] for row in db.execute(
+                f"SELECT url FROM images WHERE url IN ({placeholders})", list(released)
+            ).fetchall()}
+            for image_url in released - referenced:
+                if image_url.replace('../', 'app/') not in _pinned:
+                    _remove_files(image_url.replace('../', 'app/'))
+
+    jobs = g.pop('pending_images', [])
+    for file, job in g.pop('reused_images', []):
+        # Supprimée par une autre requête (autre processus) avant notre
+        # commit : l'envoi est toujours là pour la recréer
+        _, pending_path, final_path, _, _ = job
+        if not os.path.exists(final_path) and not get_db().in_transaction:
+            file.stream.seek(0)
+            _save_upload(file, pending_path)
+            jobs.append(job)
+        _unpin(final_path)
+    for job in jobs:
+        if current_app.config['IMAGE_WORKERS']:
+            get_executor().submit(process_upload, *job)
+        else:
+            process_upload(*job)
+
+def delete_image(image_url):
+    """
+    Libère une référence à une image
+
+    À appeler avec l'écriture qui retire image_url d'une recette ou d'un
+    commentaire. Le fichier n'est supprimé qu'en fin de requête, et seulement
+    si plus aucune ligne ne le référence (table images).
+    """
+    g.setdefault('released_images', []).append(image_url)
+
+def _remove_files(filepath):
+    # Le fichier et ses variantes
+    try:
+        for variant in glob.glob(glob.escape(filepath.rsplit('.', 1)[0]) + '.*w.*'):
+            os.remove(variant)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    except OSError:
+        logger.exception("Erreur lors de la suppression de l'image")
+
+def add_cache_headers(response):
+    """Les images rangées par contenu ne changent jamais : cache permanent"""
+    if (request.path.startswith(f"/{UPLOAD_FOLDER}/{OBJECTS_FOLDER}/")
+            and PENDING_MARK not in request.path and response.status_code in (200, 304)):
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+def upload_directories():
+    """Dossiers d'images, relatifs à app/ et dans un ordre stable (curseur de gc_uploads)"""
+    root = os.path.join('app', UPLOAD_FOLDER)
+    folders = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        if entry.name == OBJECTS_FOLDER:
+            folders.extend(f"{UPLOAD_FOLDER}/{OBJECTS_FOLDER}/{shard.name}"
+                           for shard in sorted(os.scandir(entry.path), key=lambda e: e.name) if shard.is_dir())
+        else:
+            folders.append(f"{UPLOAD_FOLDER}/{entry.name}")
+    return folders
+
+def is_referenced(db, folder, filename):
+    """
+    Indique si un fichier du dossier folder est utilisé
+
+    Un fichier appartient à l'image <nom>.<ext> dont il partage le nom avant
+    le premier point (image principale, fichier en attente, variantes) : on
+    cherche donc dans la table images une URL qui commence par "<nom>.", par
+    un parcours de la clé primaire.
+    """
+    prefix = f"../{folder}/{filename.split('.', 1)[0]}."
+    if any(path.startswith(prefix.replace('../', 'app/')) for path in list(_pinned)):
+        return True
+    # '/' suit '.' dans l'ordre des caractères : borne supérieure du préfixe
+    return db.execute(
+        "SELECT 1 FROM images WHERE url >= ? AND url < ? LIMIT 1", (prefix, prefix[:-1] + '/')
+    ).fetchone() is not None
+
+def gc_uploads(db, cursor=None, limit=GC_BATCH_SIZE, min_age=GC_MIN_AGE, delete=False):
+    """
+    Cherche les fichiers du dossier d'upload qui ne sont plus référencés
+
+    Les dossiers sont parcourus dans l'ordre de upload_directories et les
+    fichiers par ordre de nom, à partir de cursor. Chaque dossier est lu en
+    flux (os.scandir) et seuls les limit premiers noms après le curseur sont
+    gardés en mémoire : un lancement coûte une lecture de dossier et limit
+    recherches dans l'index de images, quelle que soit la taille du stock.
+
+    Args:
+        cursor: (dossier, nom) du dernier fichier examiné au lancement précédent
+        limit: Nombre maximal de fichiers examinés
+        min_age: Âge minimal (secondes) d'un fichier pour être considéré orphelin
+        delete: Supprime les orphelins au lieu de seulement les lister
+
+    Returns:
+        tuple: (orphelins [(dossier, nom, taille)], curseur suivant ou None si
+        tout le stock a été parcouru)
+    """
+    orphans = []
+    remaining = limit
+    now = time.time()
+    last = None
+    for folder in upload_directories():
+        if cursor and folder < cursor[0]:
+            continue
+        after = cursor[1] if cursor and folder == cursor[0] else ''
+        path = os.path.join('app', folder)
+        with os.scandir(path) as entries:
+            batch = heapq.nsmallest(remaining, (
+                entry for entry in entries if entry.name > after and entry.is_file()
+            ), key=lambda e: e.name)
+
+        for entry in batch:
+            last = (folder, entry.name)
+            stat = entry.stat()
+            if now - stat.st_mtime < min_age or is_referenced(db, folder, entry.name):
+                continue
+            orphans.append((folder, entry.name, stat.st_size))
+            if delete:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    logger.exception("Erreur lors de la suppression de l'image")
+
+        remaining -= len(batch)
+        if remaining <= 0:
+            return orphans, last
+    return orphans, None
+
+def missing_images(db):
+    """Images référencées en base dont le fichier n'existe plus (URL, nombre de références)"""
+    for row in db.execute("SELECT url, refcount FROM images"):
+        if PENDING_MARK not in row['url'] and not os.path.exists(row['url'].replace('../', 'app/')):
+            yield row['url'], row['refcount']
+
+@click.command('gc-uploads')
+@click.option('--delete', is_flag=True, help='Delete orphaned files instead of only listing them.')
+@click.option('--limit', default=GC_BATCH_SIZE, show_default=True, help='Files examined in this run.')
+@click.option('--min-age', default=GC_MIN_AGE, show_default=True, help='Ignore files younger than this (seconds).')
+@click.option('--reset', is_flag=True, help='Start again from the first upload directory.')
+@click.option('--reconcile', is_flag=True,
+              help='Rebuild the image reference counts from the image_url columns and list missing files first.')
+def gc_uploads_command(delete, limit, min_age, reset, reconcile):
+    """Find (and optionally delete) uploaded files no recipe or comment references."""
+    db = get_db()
+    if reconcile:
+        db.executescript("BEGIN;" + REBUILD_IMAGE_REFS_SQL + "COMMIT;")
+        for url, refcount in missing_images(db):
+            click.echo(f'missing {url} ({refcount} references)')
+
+    cursor_path = os.path.join(current_app.instance_path, GC_CURSOR_FILE)
+    cursor = None
+    if not reset and os.path.exists(cursor_path):
+        with open(cursor_path) as f:
+            cursor = json.load(f)
+
+    orphans, next_cursor = gc_uploads(db, cursor, limit, min_age, delete)
+    for folder, name, size in orphans:
+        click.echo(f"{'deleted' if delete else 'orphan'} {folder}/{name} ({size} bytes)")
+    click.echo(f"{len(orphans)} orphaned files, {sum(size for _, _, size in orphans)} bytes"
+               + (' freed.' if delete else '.'))
+
+    if next_cursor:
+        with open(cursor_path, 'w') as f:
+            json.dump(next_cursor, f)
+        click.echo(f'Stopped after {next_cursor[0]}/{next_cursor[1]}; run again to continue.')
+    else:
+        if os.path.exists(cursor_path):
+            os.remove(cursor_path)
+        click.echo('Reached the end of the upload folder.')
+
+def init_app(app):
+    app.cli.add_command(gc_uploads_command)
+    app.teardown_request(finish_request)
+    app.after_request(add_cache_headers)
+    app.add_template_filter(image_src)
+    app.add_template_filter(image_sources)
@@ -0,0 +1,163 @@
+import difflib
+
+DEFAULT_INGREDIENT_IMAGE = '/static/images/default-ingredient.jpg'
+
+
+def normalize_name(name):
+    """
+    Forme canonique d'un nom d'ingrédient (colonne ingredient_type.normalized_name)
+
+    Les espaces superflus et la casse sont ignorés. Les accents sont
+    conservés : "pâte" et "pâté" restent deux ingrédients distincts.
+    """
+    return ' '.join(name.split()).casefold()
+
+
+def resolve_ingredient_types(db, names):
+    """
+    Trouve ou crée les types d'ingrédient correspondant à names
+
+    Une requête pour les types existants, un INSERT groupé pour les
+    nouveaux (ON CONFLICT sur normalized_name : un type créé entre-temps
+    par une autre requête est simplement réutilisé), puis une requête
+    pour relire leurs identifiants. La version de ingredient_type n'est
+    incrémentée qu'une fois pour tout le lot.
+
+    Returns:
+        dict: Nom normalisé -> id dans ingredient_type
+    """
+    # Premier nom saisi pour chaque forme normalisée, tel qu'il sera affiché
+    display_names = {}
+    for name in names:
+        if name and name.strip():
+            display_names.setdefault(normalize_name(name), ' '.join(name.split()))
+    if not display_names:
+        return {}
+
+    ids = _select_ids(db, list(display_names))
+    missing = [key for key in display_names if key not in ids]
+    if missing:
+        inserted = db.executemany(
+            """INSERT INTO ingredient_type (name, normalized_name, image_url) VALUES (?, ?, ?)
+               ON CONFLICT (normalized_name) DO NOTHING""",
+            [(display_names[key], key, DEFAULT_INGREDIENT_IMAGE) for key in missing]
+        ).rowcount
+        if inserted:
+            db.execute("UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP "
+                       "WHERE name = 'ingredient_type'")
+        ids.update(_select_ids(db, missing))
+    return ids
+
+
+def insert_ingredients(db, recipe_id, ingredients):
+    """
+    Enregistre les lignes d'ingrédients d'une recette en un seul executemany
+
+    Les lignes sans nom, quantité ou unité sont ignorées.
+    """
+    rows = [ing for ing in ingredients if ing['name'] and ing['quantity'] and ing['unit']]
+    ids = resolve_ingredient_types(db, [ing['name'] for ing in rows])
+    db.executemany(
+        "INSERT INTO ingredients (recipe_id, position, ingredient_id, quantity, unit) VALUES (?, ?, ?, ?, ?)",
+        [(recipe_id, position, ids[normalize_name(ing['name'])], ing['quantity'], ing['unit'])
+         for position, ing in enumerate(rows, 1)]
+    )
+
+
+def _select_ids(db, keys):
+    placeholders = ', '.join('?' for _ in keys)
+    rows = db.execute(
+        f"SELECT id, normalized_name FROM ingredient_type WHERE normalized_name IN ({placeholders})",
+        keys
+    ).fetchall()
+    return {row['normalized_name']: row['id'] for row in rows}
+
+
+def align_rows(stored, stored_keys, wanted_keys):
+    """
+    Aligne des lignes enregistrées sur une liste soumise, d'après leur
+    contenu (difflib.SequenceMatcher) plutôt que leur rang
+
+    Les blocs identiques ne sont pas touchés : retirer la première de 30
+    lignes donne une suppression, pas 29 mises à jour. Dans un bloc qui
+    diffère, les lignes en vis-à-vis sont mises à jour (elles gardent leur
+    id et leur position), le surplus est inséré ou supprimé. Les lignes
+    insérées reçoivent une position entre celles de leurs voisines, sans
+    renuméroter les autres.
+
+    Args:
+        stored: (id, position) des lignes actuelles, dans l'ordre d'affichage
+        stored_keys: Contenu comparable de chaque ligne de stored
+        wanted_keys: Contenu comparable des lignes soumises, dans l'ordre
+
+    Returns:
+        tuple: (mises à jour (id, index dans wanted_keys), insertions
+        (position, index dans wanted_keys), ids à supprimer)
+    """
+    updates, inserts, deletes = [], [], []
+    matcher = difflib.SequenceMatcher(None, stored_keys, wanted_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        paired = min(i2 - i1, j2 - j1)
+        updates.extend((stored[i1 + k][0], j1 + k) for k in range(paired))
+        deletes.extend(row_id for row_id, _ in stored[i1 + paired:i2])
+
+        added = range(j1 + paired, j2)
+        if not added:
+            continue
+        last = i1 + paired - 1
+        lower = stored[last][1] if last >= 0 else None
+        upper = stored[i2][1] if i2 < len(stored) else None
+        if lower is None and upper is None:
+            lower, gap = 0, 1
+        elif upper is None:
+            gap = 1
+        elif lower is None:
+            lower, gap = upper - len(added) - 1, 1
+        else:
+            gap = (upper - lower) / (len(added) + 1)
+        inserts.extend((lower + gap * (k + 1), j) for k, j in enumerate(added))
+    return updates, inserts, deletes
+
+
+def sync_ingredients(db, recipe_id, stored, submitted):
+    """
+    Applique à une recette la liste d'ingrédients soumise, en n'écrivant que
+    les lignes qui changent
+
+    Les lignes sont alignées sur leur contenu (align_rows) : une ligne
+    retrouvée n'est pas touchée et garde son id, même si des lignes ont été
+    ajoutées ou retirées avant elle.
+
+    Args:
+        stored: Lignes actuelles (id, position, ingredient_id, quantity,
+            unit), dans l'ordre d'affichage, telles que renvoyées par get_recipe
+        submitted: Lignes du formulaire (name, quantity, unit)
+
+    Returns:
+        bool: True si au moins une ligne a été écrite
+    """
+    rows = [ing for ing in submitted if ing['name'] and ing['quantity'] and ing['unit']]
+    ids = resolve_ingredient_types(db, [ing['name'] for ing in rows])
+    wanted = [(ids[normalize_name(ing['name'])], _as_number(ing['quantity']), ing['unit']) for ing in rows]
+
+    updates, inserts, deletes = align_rows(
+        [(old['id'], old['position']) for old in stored],
+        [(old['ingredient_id'], old['quantity'], old['unit']) for old in stored],
+        wanted
+    )
+    db.executemany("UPDATE ingredients SET ingredient_id = ?, quantity = ?, unit = ? WHERE id = ?",
+                   [(*wanted[j], row_id) for row_id, j in updates])
+    db.executemany("INSERT INTO ingredients (recipe_id, position, ingredient_id, quantity, unit) VALUES (?, ?, ?, ?, ?)",
+                   [(recipe_id, position, *wanted[j]) for position, j in inserts])
+    db.executemany("DELETE FROM ingredients WHERE id = ?", [(row_id,) for row_id in deletes])
+    return bool(updates or inserts or deletes)
+
+
+def _as_number(value):
+    # Les quantités arrivent en texte du formulaire et sont stockées en REAL
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
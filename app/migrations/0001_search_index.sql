@@ -0,0 +1,25 @@
+-- Index plein texte (app.search) et index couvrants de la recherche par filtres
+
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+  title,
+  description,
+  notes,
+  instructions,
+  ingredients,
+  tokenize = 'unicode61 remove_diacritics 2',
+  prefix = '2 3'
+);
+INSERT INTO recipes_fts (recipes_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0, 1.0, 3.0)');
+
+DELETE FROM recipes_fts;
+INSERT INTO recipes_fts (rowid, title, description, notes, instructions, ingredients)
+SELECT r.id, r.title, r.description, r.notes,
+       (SELECT group_concat(ins.instruction, ' ')
+          FROM instructions ins WHERE ins.recipe_id = r.id),
+       (SELECT group_concat(it.name, ' ')
+          FROM ingredients ing JOIN ingredient_type it ON ing.ingredient_id = it.id
+          WHERE ing.recipe_id = r.id)
+FROM recipes r;
+
+CREATE INDEX IF NOT EXISTS idx_recipes_added ON recipes (added, id, difficulty, prepTime, cookTime, servings, author_grade);
+CREATE INDEX IF NOT EXISTS idx_recipes_difficulty ON recipes (difficulty, added, id, prepTime, cookTime, servings, author_grade);
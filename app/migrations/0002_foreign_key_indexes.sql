@@ -0,0 +1,17 @@
+-- Index des clés étrangères parcourues à chaque affichage de recette,
+-- par les listes de l'administration et par la saisie des ingrédients
+
+CREATE INDEX IF NOT EXISTS idx_ingredients_recipe ON ingredients (recipe_id);
+CREATE INDEX IF NOT EXISTS idx_instructions_recipe ON instructions (recipe_id, step);
+CREATE INDEX IF NOT EXISTS idx_comments_recipe ON comments (recipe_id, id);
+CREATE INDEX IF NOT EXISTS idx_comments_author ON comments (author_id);
+CREATE INDEX IF NOT EXISTS idx_recipes_author ON recipes (author_id);
+
+-- Un favori par couple (utilisateur, recette) : on retire les doublons avant l'index unique
+DELETE FROM favourites
+WHERE id NOT IN (SELECT MIN(id) FROM favourites GROUP BY author_id, recipe_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_favourites_author_recipe ON favourites (author_id, recipe_id);
+CREATE INDEX IF NOT EXISTS idx_favourites_recipe ON favourites (recipe_id);
+
+-- Sert directement les recherches "WHERE LOWER(name) = LOWER(?)"
+CREATE INDEX IF NOT EXISTS idx_ingredient_type_lower_name ON ingredient_type (LOWER(name));
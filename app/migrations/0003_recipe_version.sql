@@ -0,0 +1,50 @@
+-- Numéro de version de chaque recette, incrémenté par trigger à chaque
+-- modification de la recette ou de ses ingrédients, étapes et commentaires.
+-- Sert de clé au cache des pages (app.cache).
+
+ALTER TABLE recipes ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER recipes_version_update AFTER UPDATE ON recipes
+WHEN NEW.version = OLD.version
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER ingredients_version_insert AFTER INSERT ON ingredients
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id = NEW.recipe_id;
+END;
+CREATE TRIGGER ingredients_version_update AFTER UPDATE ON ingredients
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+CREATE TRIGGER ingredients_version_delete AFTER DELETE ON ingredients
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER instructions_version_insert AFTER INSERT ON instructions
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id = NEW.recipe_id;
+END;
+CREATE TRIGGER instructions_version_update AFTER UPDATE ON instructions
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+CREATE TRIGGER instructions_version_delete AFTER DELETE ON instructions
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER comments_version_insert AFTER INSERT ON comments
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id = NEW.recipe_id;
+END;
+CREATE TRIGGER comments_version_update AFTER UPDATE ON comments
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+CREATE TRIGGER comments_version_delete AFTER DELETE ON comments
+BEGIN
+  UPDATE recipes SET version = version + 1 WHERE id = OLD.recipe_id;
+END;
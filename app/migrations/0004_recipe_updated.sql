@@ -0,0 +1,106 @@
+-- Date de dernière modification des recettes (en-têtes Last-Modified / ETag)
+-- et compteur de modifications par table pour les réponses qui agrègent
+-- toute une table (liste des ingrédients, statistiques)
+
+ALTER TABLE recipes ADD COLUMN updated TIMESTAMP DEFAULT NULL;
+
+-- Les triggers de version renseignent maintenant aussi recipes.updated
+DROP TRIGGER IF EXISTS recipes_version_update;
+DROP TRIGGER IF EXISTS ingredients_version_insert;
+DROP TRIGGER IF EXISTS ingredients_version_update;
+DROP TRIGGER IF EXISTS ingredients_version_delete;
+DROP TRIGGER IF EXISTS instructions_version_insert;
+DROP TRIGGER IF EXISTS instructions_version_update;
+DROP TRIGGER IF EXISTS instructions_version_delete;
+DROP TRIGGER IF EXISTS comments_version_insert;
+DROP TRIGGER IF EXISTS comments_version_update;
+DROP TRIGGER IF EXISTS comments_version_delete;
+
+CREATE TRIGGER recipes_version_update AFTER UPDATE ON recipes
+WHEN NEW.version = OLD.version
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER ingredients_version_insert AFTER INSERT ON ingredients
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id = NEW.recipe_id;
+END;
+CREATE TRIGGER ingredients_version_update AFTER UPDATE ON ingredients
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+CREATE TRIGGER ingredients_version_delete AFTER DELETE ON ingredients
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER instructions_version_insert AFTER INSERT ON instructions
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id = NEW.recipe_id;
+END;
+CREATE TRIGGER instructions_version_update AFTER UPDATE ON instructions
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+CREATE TRIGGER instructions_version_delete AFTER DELETE ON instructions
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER comments_version_insert AFTER INSERT ON comments
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id = NEW.recipe_id;
+END;
+CREATE TRIGGER comments_version_update AFTER UPDATE ON comments
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+CREATE TRIGGER comments_version_delete AFTER DELETE ON comments
+BEGIN
+  UPDATE recipes SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE id = OLD.recipe_id;
+END;
+
+CREATE TABLE data_versions (
+  name TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0,
+  updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO data_versions (name) VALUES ('recipes'), ('comments'), ('ingredient_type');
+
+CREATE TRIGGER recipes_data_version_insert AFTER INSERT ON recipes
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'recipes';
+END;
+CREATE TRIGGER recipes_data_version_update AFTER UPDATE ON recipes
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'recipes';
+END;
+CREATE TRIGGER recipes_data_version_delete AFTER DELETE ON recipes
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'recipes';
+END;
+CREATE TRIGGER comments_data_version_insert AFTER INSERT ON comments
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'comments';
+END;
+CREATE TRIGGER comments_data_version_update AFTER UPDATE ON comments
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'comments';
+END;
+CREATE TRIGGER comments_data_version_delete AFTER DELETE ON comments
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'comments';
+END;
+CREATE TRIGGER ingredient_type_data_version_insert AFTER INSERT ON ingredient_type
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'ingredient_type';
+END;
+CREATE TRIGGER ingredient_type_data_version_update AFTER UPDATE ON ingredient_type
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'ingredient_type';
+END;
+CREATE TRIGGER ingredient_type_data_version_delete AFTER DELETE ON ingredient_type
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'ingredient_type';
+END;
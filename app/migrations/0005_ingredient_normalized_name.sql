@@ -0,0 +1,19 @@
+-- Nom normalisé et unique des types d'ingrédient (app.ingredients.normalize_name),
+-- qui remplace les recherches "LOWER(name) = LOWER(?)" et permet les
+-- insertions groupées avec ON CONFLICT
+
+ALTER TABLE ingredient_type ADD COLUMN normalized_name TEXT;
+UPDATE ingredient_type SET normalized_name = normalize_name(name);
+
+-- Les doublons sont fusionnés sur le type le plus ancien
+UPDATE ingredients SET ingredient_id = (
+  SELECT MIN(t2.id)
+  FROM ingredient_type t1 JOIN ingredient_type t2 ON t2.normalized_name = t1.normalized_name
+  WHERE t1.id = ingredients.ingredient_id
+)
+WHERE ingredient_id NOT IN (SELECT MIN(id) FROM ingredient_type GROUP BY normalized_name);
+DELETE FROM ingredient_type
+WHERE id NOT IN (SELECT MIN(id) FROM ingredient_type GROUP BY normalized_name);
+
+DROP INDEX IF EXISTS idx_ingredient_type_lower_name;
+CREATE UNIQUE INDEX idx_ingredient_type_normalized_name ON ingredient_type (normalized_name);
@@ -0,0 +1,58 @@
+-- Comptage des références aux images envoyées : un même fichier (même
+-- contenu) peut être partagé par plusieurs recettes et commentaires et n'est
+-- supprimé du disque qu'avec sa dernière référence. Le compte est tenu à jour
+-- par des triggers sur image_url.
+
+CREATE TABLE images ( -- Nombre de lignes (recettes, commentaires) qui référencent chaque fichier
+  url TEXT PRIMARY KEY, -- valeur de image_url
+  refcount INTEGER NOT NULL
+);
+
+INSERT INTO images (url, refcount)
+SELECT image_url, COUNT(*) FROM (
+  SELECT image_url FROM recipes WHERE image_url IS NOT NULL
+  UNION ALL
+  SELECT image_url FROM comments WHERE image_url IS NOT NULL
+)
+GROUP BY image_url;
+
+CREATE TRIGGER recipes_images_insert AFTER INSERT ON recipes
+WHEN NEW.image_url IS NOT NULL
+BEGIN
+  INSERT INTO images (url, refcount) VALUES (NEW.image_url, 1)
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER recipes_images_update AFTER UPDATE OF image_url ON recipes
+WHEN NEW.image_url IS NOT OLD.image_url
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+  INSERT INTO images (url, refcount) SELECT NEW.image_url, 1 WHERE NEW.image_url IS NOT NULL
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER recipes_images_delete AFTER DELETE ON recipes
+WHEN OLD.image_url IS NOT NULL
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+END;
+CREATE TRIGGER comments_images_insert AFTER INSERT ON comments
+WHEN NEW.image_url IS NOT NULL
+BEGIN
+  INSERT INTO images (url, refcount) VALUES (NEW.image_url, 1)
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER comments_images_update AFTER UPDATE OF image_url ON comments
+WHEN NEW.image_url IS NOT OLD.image_url
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+  INSERT INTO images (url, refcount) SELECT NEW.image_url, 1 WHERE NEW.image_url IS NOT NULL
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER comments_images_delete AFTER DELETE ON comments
+WHEN OLD.image_url IS NOT NULL
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+END;
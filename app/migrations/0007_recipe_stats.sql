@@ -0,0 +1,63 @@
+-- Agrégats de notes et de favoris par recette : le classement par note de la
+-- communauté devient une lecture d'index au lieu d'un GROUP BY sur comments.
+-- Les triggers les mettent à jour à chaque écriture sur comments et favourites.
+
+CREATE TABLE recipe_stats ( -- Agrégats par recette, tenus à jour par les triggers *_stats_*
+  recipe_id INTEGER PRIMARY KEY,
+  comment_count INTEGER NOT NULL DEFAULT 0,
+  grade_sum INTEGER NOT NULL DEFAULT 0,
+  favourite_count INTEGER NOT NULL DEFAULT 0,
+  avg_grade REAL GENERATED ALWAYS AS (
+    CASE WHEN comment_count > 0 THEN CAST(grade_sum AS REAL) / comment_count END
+  ) STORED, -- note moyenne des commentaires, NULL sans commentaire
+  FOREIGN KEY (recipe_id) REFERENCES recipes (id)
+);
+
+-- Classement par note de la communauté, puis par nombre d'avis
+CREATE INDEX idx_recipe_stats_avg_grade ON recipe_stats (avg_grade DESC, comment_count DESC);
+CREATE INDEX idx_recipe_stats_favourites ON recipe_stats (favourite_count DESC);
+-- MIN(grade) / MAX(grade) des statistiques admin
+CREATE INDEX idx_comments_grade ON comments (grade);
+
+INSERT INTO recipe_stats (recipe_id, comment_count, grade_sum, favourite_count)
+SELECT r.id,
+       (SELECT COUNT(*) FROM comments c WHERE c.recipe_id = r.id),
+       (SELECT COALESCE(SUM(c.grade), 0) FROM comments c WHERE c.recipe_id = r.id),
+       (SELECT COUNT(*) FROM favourites f WHERE f.recipe_id = r.id)
+FROM recipes r;
+
+CREATE TRIGGER recipes_stats_insert AFTER INSERT ON recipes
+BEGIN
+  INSERT INTO recipe_stats (recipe_id) VALUES (NEW.id);
+END;
+CREATE TRIGGER recipes_stats_delete AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM recipe_stats WHERE recipe_id = OLD.id;
+END;
+
+CREATE TRIGGER comments_stats_insert AFTER INSERT ON comments
+BEGIN
+  UPDATE recipe_stats SET comment_count = comment_count + 1, grade_sum = grade_sum + NEW.grade
+  WHERE recipe_id = NEW.recipe_id;
+END;
+CREATE TRIGGER comments_stats_update AFTER UPDATE OF recipe_id, grade ON comments
+BEGIN
+  UPDATE recipe_stats SET comment_count = comment_count - 1, grade_sum = grade_sum - OLD.grade
+  WHERE recipe_id = OLD.recipe_id;
+  UPDATE recipe_stats SET comment_count = comment_count + 1, grade_sum = grade_sum + NEW.grade
+  WHERE recipe_id = NEW.recipe_id;
+END;
+CREATE TRIGGER comments_stats_delete AFTER DELETE ON comments
+BEGIN
+  UPDATE recipe_stats SET comment_count = comment_count - 1, grade_sum = grade_sum - OLD.grade
+  WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER favourites_stats_insert AFTER INSERT ON favourites
+BEGIN
+  UPDATE recipe_stats SET favourite_count = favourite_count + 1 WHERE recipe_id = NEW.recipe_id;
+END;
+CREATE TRIGGER favourites_stats_delete AFTER DELETE ON favourites
+BEGIN
+  UPDATE recipe_stats SET favourite_count = favourite_count - 1 WHERE recipe_id = OLD.recipe_id;
+END;
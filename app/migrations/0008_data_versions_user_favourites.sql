@@ -0,0 +1,29 @@
+-- Compteurs de modifications des tables user et favourites, utilisés par le
+-- cache des statistiques du tableau de bord admin (app.admin_stats)
+
+INSERT INTO data_versions (name) VALUES ('user'), ('favourites');
+
+CREATE TRIGGER user_data_version_insert AFTER INSERT ON user
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'user';
+END;
+CREATE TRIGGER user_data_version_update AFTER UPDATE ON user
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'user';
+END;
+CREATE TRIGGER user_data_version_delete AFTER DELETE ON user
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'user';
+END;
+CREATE TRIGGER favourites_data_version_insert AFTER INSERT ON favourites
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'favourites';
+END;
+CREATE TRIGGER favourites_data_version_update AFTER UPDATE ON favourites
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'favourites';
+END;
+CREATE TRIGGER favourites_data_version_delete AFTER DELETE ON favourites
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'favourites';
+END;
@@ -0,0 +1,3 @@
+-- Tri par titre de la liste des recettes de l'administration (app.admin_tables)
+
+CREATE INDEX idx_recipes_title ON recipes (title);
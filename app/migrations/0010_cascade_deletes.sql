@@ -0,0 +1,27 @@
+-- Suppressions en cascade : supprimer une recette supprime ses ingrédients,
+-- étapes, commentaires et favoris ; supprimer un utilisateur supprime ses
+-- recettes, commentaires et favoris. Chaque cascade est une suppression
+-- ensembliste par index, faite par SQLite dans l'instruction DELETE.
+
+-- Lignes orphelines laissées par les anciennes suppressions
+DELETE FROM favourites WHERE recipe_id NOT IN (SELECT id FROM recipes)
+                          OR author_id NOT IN (SELECT id FROM user);
+DELETE FROM comments WHERE recipe_id NOT IN (SELECT id FROM recipes)
+                        OR author_id NOT IN (SELECT id FROM user);
+DELETE FROM ingredients WHERE recipe_id NOT IN (SELECT id FROM recipes);
+DELETE FROM instructions WHERE recipe_id NOT IN (SELECT id FROM recipes);
+
+CREATE TRIGGER recipes_cascade_delete AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM ingredients WHERE recipe_id = OLD.id;
+  DELETE FROM instructions WHERE recipe_id = OLD.id;
+  DELETE FROM comments WHERE recipe_id = OLD.id;
+  DELETE FROM favourites WHERE recipe_id = OLD.id;
+END;
+
+CREATE TRIGGER user_cascade_delete AFTER DELETE ON user
+BEGIN
+  DELETE FROM favourites WHERE author_id = OLD.id;
+  DELETE FROM comments WHERE author_id = OLD.id;
+  DELETE FROM recipes WHERE author_id = OLD.id;
+END;
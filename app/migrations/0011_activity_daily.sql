@@ -0,0 +1,35 @@
+-- Séries temporelles de l'administration (app.admin_stats.activity_series) :
+-- nombre d'inscriptions, de recettes, de commentaires et de favoris ajoutés
+-- par jour (UTC), incrémenté par les triggers *_activity_insert.
+-- Seules les recettes ont une date d'ajout : l'historique des autres
+-- métriques commence à cette migration.
+CREATE TABLE activity_daily (
+  metric TEXT NOT NULL, -- signups, recipes, comments, favourites
+  day TEXT NOT NULL, -- YYYY-MM-DD
+  count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (metric, day)
+) WITHOUT ROWID;
+
+INSERT INTO activity_daily (metric, day, count)
+SELECT 'recipes', date(added), COUNT(*) FROM recipes GROUP BY date(added);
+
+CREATE TRIGGER user_activity_insert AFTER INSERT ON user
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('signups', date('now'), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER recipes_activity_insert AFTER INSERT ON recipes
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('recipes', date(NEW.added), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER comments_activity_insert AFTER INSERT ON comments
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('comments', date('now'), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER favourites_activity_insert AFTER INSERT ON favourites
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('favourites', date('now'), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
@@ -0,0 +1,3 @@
+-- Nombre d'utilisations de chaque type d'ingrédient (classement de
+-- l'autocomplétion, app.autocomplete) par parcours d'index
+CREATE INDEX idx_ingredients_type ON ingredients (ingredient_id);
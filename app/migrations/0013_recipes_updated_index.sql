@@ -0,0 +1,3 @@
+-- Recettes modifiées depuis une date : mise à jour incrémentale de l'index
+-- des ingrédients en mémoire (app.pantry)
+CREATE INDEX idx_recipes_updated ON recipes (updated);
@@ -0,0 +1,21 @@
+-- Recettes similaires précalculées par la commande compute-similar-recipes
+-- (app.similar) : ingrédients en commun (TF-IDF) et favoris en commun
+
+CREATE TABLE recipe_neighbours (
+  recipe_id INTEGER NOT NULL,
+  neighbour_id INTEGER NOT NULL,
+  score REAL NOT NULL, -- cosinus pondéré, entre 0 et 1
+  PRIMARY KEY (recipe_id, neighbour_id)
+) WITHOUT ROWID;
+-- Voisins d'une recette dans l'ordre d'affichage, en une recherche d'index
+CREATE INDEX idx_recipe_neighbours_score ON recipe_neighbours (recipe_id, score DESC);
+CREATE INDEX idx_recipe_neighbours_neighbour ON recipe_neighbours (neighbour_id);
+
+-- Incrémenté par la commande après chaque calcul : ETag des pages de recettes
+INSERT INTO data_versions (name) VALUES ('recipe_neighbours');
+
+CREATE TRIGGER recipes_neighbours_delete AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM recipe_neighbours WHERE recipe_id = OLD.id;
+  DELETE FROM recipe_neighbours WHERE neighbour_id = OLD.id;
+END;
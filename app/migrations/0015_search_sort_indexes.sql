@@ -0,0 +1,6 @@
+-- Tris de la recherche (app.search.SEARCH_SORTS) : chaque clé de tri suivie
+-- de l'identifiant qui départage les ex aequo, pour la pagination par curseur
+CREATE INDEX idx_recipes_grade ON recipes (author_grade, id);
+CREATE INDEX idx_recipes_prep_time ON recipes (prepTime, id);
+CREATE INDEX idx_recipes_total_time ON recipes (prepTime + cookTime, id);
+CREATE INDEX idx_recipe_stats_popularity ON recipe_stats (favourite_count, recipe_id);
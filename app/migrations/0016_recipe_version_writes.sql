@@ -0,0 +1,15 @@
+-- La version des recettes est incrémentée une fois par écriture par
+-- l'application (app.db.touch_recipes), et non plus par des triggers par
+-- ligne : enregistrer une recette de 30 ingrédients réécrivait la ligne de
+-- la recette (et data_versions) des dizaines de fois
+
+DROP TRIGGER IF EXISTS recipes_version_update;
+DROP TRIGGER IF EXISTS ingredients_version_insert;
+DROP TRIGGER IF EXISTS ingredients_version_update;
+DROP TRIGGER IF EXISTS ingredients_version_delete;
+DROP TRIGGER IF EXISTS instructions_version_insert;
+DROP TRIGGER IF EXISTS instructions_version_update;
+DROP TRIGGER IF EXISTS instructions_version_delete;
+DROP TRIGGER IF EXISTS comments_version_insert;
+DROP TRIGGER IF EXISTS comments_version_update;
+DROP TRIGGER IF EXISTS comments_version_delete;
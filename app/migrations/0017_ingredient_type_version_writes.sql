@@ -0,0 +1,4 @@
+-- Les types d'ingrédient d'une recette sont créés par un INSERT groupé :
+-- la version de la table est incrémentée une fois par lot par l'application
+-- (app.ingredients.resolve_ingredient_types) plutôt qu'une fois par ligne
+DROP TRIGGER IF EXISTS ingredient_type_data_version_insert;
@@ -0,0 +1,14 @@
+-- Recettes supprimées récemment, pour la mise à jour incrémentale de l'index
+-- des ingrédients en mémoire (app.pantry). Seul le dernier jour est gardé :
+-- un index plus ancien est reconstruit entièrement.
+CREATE TABLE deleted_recipes (
+  recipe_id INTEGER PRIMARY KEY,
+  deleted TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_deleted_recipes_deleted ON deleted_recipes (deleted);
+
+CREATE TRIGGER recipes_deleted_log AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM deleted_recipes WHERE deleted < datetime('now', '-1 day');
+  INSERT OR REPLACE INTO deleted_recipes (recipe_id) VALUES (OLD.id);
+END;
@@ -0,0 +1,8 @@
+-- Ordre d'affichage explicite des ingrédients : sync_ingredients aligne les
+-- lignes sur leur contenu et place une ligne insérée entre ses voisines, sans
+-- renuméroter les autres. Les lignes existantes gardent l'ordre de leur id.
+ALTER TABLE ingredients ADD COLUMN position REAL NOT NULL DEFAULT 0;
+UPDATE ingredients SET position = id;
+
+DROP INDEX IF EXISTS idx_ingredients_recipe;
+CREATE INDEX idx_ingredients_recipe ON ingredients (recipe_id, position);
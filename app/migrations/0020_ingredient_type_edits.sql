@@ -0,0 +1,17 @@
+-- Renommages et suppressions de types d'ingrédient comptés à part : l'index
+-- d'autocomplétion (app.autocomplete) complète sa liste tant que la table ne
+-- reçoit que des insertions, et la reconstruit dès que ce compteur change
+INSERT INTO data_versions (name) VALUES ('ingredient_type_edits');
+
+DROP TRIGGER IF EXISTS ingredient_type_data_version_update;
+DROP TRIGGER IF EXISTS ingredient_type_data_version_delete;
+CREATE TRIGGER ingredient_type_data_version_update AFTER UPDATE ON ingredient_type
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP
+  WHERE name IN ('ingredient_type', 'ingredient_type_edits');
+END;
+CREATE TRIGGER ingredient_type_data_version_delete AFTER DELETE ON ingredient_type
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP
+  WHERE name IN ('ingredient_type', 'ingredient_type_edits');
+END;
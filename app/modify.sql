@@ -1 +0,0 @@
--- Write here the SQL commands to modify the database schema as needed. For example, if you want to add a new column to an existing table, you can use the following command:
\ No newline at end of file
@@ -0,0 +1,336 @@
+import bisect
+import itertools
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from flask import current_app
+
+from app.db import data_version
+
+PANTRY_PAGE_SIZE = 24
+PANTRY_MODES = ('all', 'any', 'missing')
+# Nombre d'ingrédients sélectionnables à la fois
+PANTRY_MAX_INGREDIENTS = 30
+# Marge de relecture des recettes modifiées : une transaction validée après
+# la dernière synchronisation peut porter une date un peu antérieure
+SYNC_OVERLAP = '-60 seconds'
+# Durée pendant laquelle deleted_recipes garde une suppression (voir le
+# trigger recipes_deleted_log) : un index synchronisé avant est reconstruit
+DELETED_RECIPES_RETENTION = 24 * 3600 - 60
+
+PantryPage = namedtuple('PantryPage', 'recipes total')
+
+# Recettes supprimées depuis une date, par idx_deleted_recipes_deleted
+DELETED_RECIPES_SQL = "SELECT recipe_id FROM deleted_recipes WHERE deleted >= datetime(?, ?)"
+
+# Recettes ajoutées ou modifiées (ingrédients compris, via recipes.updated)
+# depuis une date, par idx_recipes_added et idx_recipes_updated
+CHANGED_RECIPES_SQL = """
+    SELECT id FROM recipes WHERE added >= datetime(?, ?)
+    UNION
+    SELECT id FROM recipes WHERE updated >= datetime(?, ?)
+"""
+
+
+def _to_bitmap(recipe_ids):
+    # Entier dont le bit n vaut 1 si la recette n est dans la liste
+    if isinstance(recipe_ids, int):
+        return recipe_ids
+    if not recipe_ids:
+        return 0
+    buffer = bytearray(recipe_ids[-1] // 8 + 1)
+    for recipe_id in recipe_ids:
+        buffer[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _highest_bits(bits):
+    # Identifiants d'un bitmap, du plus grand (recette la plus récente) au plus petit
+    while bits:
+        bit = bits.bit_length() - 1
+        yield bit
+        bits ^= 1 << bit
+
+
+class RecipeIngredientIndex:
+    """
+    Index inversé type d'ingrédient -> recettes, en mémoire
+
+    La liste des recettes d'un type d'ingrédient est un tableau trié
+    d'entiers, ou un bitmap (entier Python, un bit par recette) pour les
+    ingrédients courants, là où il est plus compact. Les recettes sont
+    aussi rangées en bitmaps par nombre d'ingrédients.
+
+    Une recherche combine les bitmaps des ingrédients demandés : leur somme
+    bit à bit (compteurs en tranches de bits) donne, pour chaque nombre
+    d'ingrédients présents, l'ensemble des recettes concernées. Chaque
+    groupe (présents, taille de la recette) est un ET de deux bitmaps,
+    parcourus dans l'ordre de couverture : le coût ne dépend pas du nombre
+    de recettes candidates.
+
+    L'index est propre au processus. Il est construit à la première
+    requête puis, quand la table recipes a changé (data_versions), mis à
+    jour à partir des seules recettes ajoutées, modifiées ou supprimées
+    (table deleted_recipes) depuis. Un index resté sans mise à jour plus
+    longtemps que deleted_recipes ne garde les suppressions est reconstruit.
+
+    Les mises à jour modifient des dictionnaires de travail, protégés par
+    le verrou ; les recherches lisent une copie publiée d'un bloc
+    (_generation), jamais modifiée ensuite.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._recipes = {}
+        self._sizes = {}
+        self._max_id = 0
+        # (listes par ingrédient, bitmaps par taille, plus grand id) lus par search
+        self._generation = ({}, {}, 0)
+        self._version = None
+        self._synced = None
+        self._synced_at = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, db):
+        """Met l'index à jour si la table recipes a changé"""
+        version, _ = data_version(db, 'recipes')
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            now = db.execute('SELECT CURRENT_TIMESTAMP').fetchone()[0]
+            if self._synced is None or time.time() - self._synced_at > DELETED_RECIPES_RETENTION:
+                self._build(db)
+            else:
+                self._update(db)
+            self._publish()
+            self._version, self._synced, self._synced_at = version, now, time.time()
+
+    def _publish(self):
+        # Copie des dictionnaires, pas de leurs valeurs : tableaux et bitmaps
+        # sont remplacés, jamais modifiés sur place (voir _set)
+        self._generation = (dict(self._postings), dict(self._sizes), self._max_id)
+
+    def _dense(self, count):
+        # Un bitmap coûte un bit par recette, un tableau 32 bits par entrée
+        return count * 32 > self._max_id
+
+    def _build(self, db):
+        # Parcours de idx_ingredients_type, ligne à ligne
+        rows = db.execute(
+            'SELECT DISTINCT ingredient_id, recipe_id FROM ingredients ORDER BY ingredient_id, recipe_id'
+        )
+        postings, recipes = {}, {}
+        for ingredient_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+            postings[ingredient_id] = array('i', (row[1] for row in group))
+            for recipe_id in postings[ingredient_id]:
+                recipes.setdefault(recipe_id, array('i')).append(ingredient_id)
+
+        self._max_id = max(recipes, default=0)
+        for ingredient_id, posting in postings.items():
+            if self._dense(len(posting)):
+                postings[ingredient_id] = _to_bitmap(posting)
+        by_size = {}
+        for recipe_id, ingredient_ids in recipes.items():
+            by_size.setdefault(len(ingredient_ids), array('i')).append(recipe_id)
+        self._postings, self._recipes = postings, recipes
+        self._sizes = {size: _to_bitmap(sorted(ids)) for size, ids in by_size.items()}
+
+    def _update(self, db):
+        for (recipe_id,) in db.execute(DELETED_RECIPES_SQL, (self._synced, SYNC_OVERLAP)).fetchall():
+            if recipe_id in self._recipes:
+                self._set(recipe_id, set())
+        changed = [row[0] for row in db.execute(
+            CHANGED_RECIPES_SQL, (self._synced, SYNC_OVERLAP, self._synced, SYNC_OVERLAP)
+        ).fetchall()]
+        if not changed:
+            return
+        placeholders = ', '.join('?' for _ in changed)
+        current = {recipe_id: set() for recipe_id in changed}
+        for recipe_id, ingredient_id in db.execute(
+            f'SELECT recipe_id, ingredient_id FROM ingredients WHERE recipe_id IN ({placeholders})', changed
+        ).fetchall():
+            current[recipe_id].add(ingredient_id)
+        for recipe_id, ingredient_ids in current.items():
+            self._set(recipe_id, ingredient_ids)
+
+    def _set(self, recipe_id, ingredient_ids):
+        # Les tableaux sont remplacés et non modifiés sur place (les bitmaps
+        # sont immuables) : les générations déjà publiées restent intactes
+        bit = 1 << recipe_id
+        self._max_id = max(self._max_id, recipe_id)
+        old = set(self._recipes.get(recipe_id, ()))
+        for ingredient_id in old - ingredient_ids:
+            posting = self._postings[ingredient_id]
+            if isinstance(posting, int):
+                self._postings[ingredient_id] = posting & ~bit
+            else:
+                posting = array('i', posting)
+                del posting[bisect.bisect_left(posting, recipe_id)]
+                self._postings[ingredient_id] = posting
+        for ingredient_id in ingredient_ids - old:
+            posting = self._postings.get(ingredient_id, array('i'))
+            if isinstance(posting, int):
+                self._postings[ingredient_id] = posting | bit
+            else:
+                posting = array('i', posting)
+                bisect.insort(posting, recipe_id)
+                self._postings[ingredient_id] = _to_bitmap(posting) if self._dense(len(posting)) else posting
+
+        if len(old) != len(ingredient_ids):
+            if old:
+                self._sizes[len(old)] &= ~bit
+            if ingredient_ids:
+                self._sizes[len(ingredient_ids)] = self._sizes.get(len(ingredient_ids), 0) | bit
+        if ingredient_ids:
+            self._recipes[recipe_id] = array('i', sorted(ingredient_ids))
+        else:
+            self._recipes.pop(recipe_id, None)
+
+    def discard(self, recipe_id):
+        """Retire une recette supprimée depuis le dernier refresh (suppression concurrente)"""
+        with self._lock:
+            self._set(recipe_id, set())
+            self._publish()
+
+    def search(self, ingredient_ids, mode='any', max_missing=0, offset=0, limit=PANTRY_PAGE_SIZE):
+        """
+        Recettes qui correspondent à un ensemble d'ingrédients, classées par
+        couverture
+
+        Ordre : part de la recette couverte, puis le moins d'ingrédients
+        manquants, puis le plus d'ingrédients présents, puis la plus récente.
+
+        Args:
+            ingredient_ids: Types d'ingrédient disponibles
+            mode: 'all' (la recette les contient tous), 'any' (au moins un)
+                ou 'missing' (il manque au plus max_missing ingrédients à
+                la recette)
+            offset, limit: Tranche de résultats demandée
+
+        Returns:
+            tuple: ([(id de recette, ingrédients présents, ingrédients de
+            la recette)], nombre total de recettes trouvées)
+        """
+        postings, sizes, max_id = self._generation
+        wanted = set(ingredient_ids)
+        bitmaps = [_to_bitmap(postings[i]) for i in wanted if i in postings]
+        if not bitmaps or (mode == 'all' and len(bitmaps) < len(wanted)):
+            return [], 0
+
+        # Compteur par recette du nombre d'ingrédients présents, en tranches
+        # de bits : counters[i] contient le bit de poids 2**i de chaque compteur
+        counters = []
+        for bits in bitmaps:
+            for i, counter in enumerate(counters):
+                counters[i], bits = counter ^ bits, counter & bits
+                if not bits:
+                    break
+            if bits:
+                counters.append(bits)
+
+        every = (1 << (max_id + 1)) - 1
+        matched_min = len(bitmaps) if mode == 'all' else 1
+        groups = []
+        for matched in range(matched_min, len(bitmaps) + 1):
+            exact = every
+            for i, counter in enumerate(counters):
+                exact &= counter if matched >> i & 1 else ~counter
+            if not exact:
+                continue
+            for size, recipes in sizes.items():
+                if size < matched or (mode == 'missing' and size - matched > max_missing):
+                    continue
+                group = exact & recipes
+                if group:
+                    groups.append(((-matched / size, size - matched, -matched), matched, size, group))
+        groups.sort(key=lambda group: group[0])
+
+        total = 0
+        page = []
+        for _, matched, size, group in groups:
+            count = group.bit_count()
+            if total + count > offset and len(page) < limit:
+                skip = max(offset - total, 0)
+                for recipe_id in itertools.islice(_highest_bits(group), skip, skip + limit - len(page)):
+                    page.append((recipe_id, matched, size))
+            total += count
+        return page, total
+
+
+def get_recipe_ingredient_index():
+    return current_app.extensions['recipe_ingredient_index']
+
+
+def find_by_ingredients(db, ingredient_ids, mode='any', max_missing=0, offset=0, limit=PANTRY_PAGE_SIZE):
+    """
+    Recherche "cuisiner avec ce que j'ai", classée par couverture
+
+    Args:
+        ingredient_ids: Types d'ingrédient disponibles
+        mode: Voir RecipeIngredientIndex.search
+        max_missing: Ingrédients manquants tolérés en mode 'missing'
+        offset, limit: Tranche de résultats demandée
+
+    Returns:
+        PantryPage: recettes (lignes de recipes avec username, plus
+        matched, size et missing, les noms des ingrédients manquants) et
+        nombre total de correspondances
+    """
+    index = get_recipe_ingredient_index()
+    index.refresh(db)
+    ranked, total = index.search(ingredient_ids, mode, max_missing, offset, limit)
+    if not ranked:
+        return PantryPage([], total)
+
+    ids = [recipe_id for recipe_id, _, _ in ranked]
+    placeholders = ', '.join('?' for _ in ids)
+    rows = {row['id']: row for row in db.execute(
+        f"""SELECT r.*, u.username FROM recipes r JOIN user u ON r.author_id = u.id
+            WHERE r.id IN ({placeholders})""", ids
+    ).fetchall()}
+
+    wanted = ', '.join('?' for _ in ingredient_ids)
+    missing = {}
+    for row in db.execute(
+        f"""SELECT ing.recipe_id, it.name
+            FROM ingredients ing JOIN ingredient_type it ON it.id = ing.ingredient_id
+            WHERE ing.recipe_id IN ({placeholders}) AND ing.ingredient_id NOT IN ({wanted})
+            ORDER BY ing.position, ing.id""", (*ids, *ingredient_ids)
+    ).fetchall():
+        missing.setdefault(row['recipe_id'], []).append(row['name'])
+
+    recipes = []
+    for recipe_id, matched, size in ranked:
+        if recipe_id not in rows:
+            index.discard(recipe_id)
+            continue
+        recipes.append({**dict(rows[recipe_id]), 'matched': matched, 'size': size,
+                        'missing': missing.get(recipe_id, [])})
+    return PantryPage(recipes, total)
+
+
+def parse_pantry_args(args):
+    """
+    Lit ingredient (répété), mode, max_missing et offset d'une requête
+
+    Les valeurs invalides sont remplacées par celles par défaut.
+
+    Returns:
+        tuple: (ids d'ingrédients, mode, max_missing, offset)
+    """
+    ingredient_ids = []
+    for value in args.getlist('ingredient'):
+        if value.isdigit() and int(value) not in ingredient_ids:
+            ingredient_ids.append(int(value))
+    mode = args.get('mode') if args.get('mode') in PANTRY_MODES else 'any'
+    max_missing = max(args.get('max_missing', 2, type=int), 0)
+    offset = max(args.get('offset', 0, type=int), 0)
+    return ingredient_ids[:PANTRY_MAX_INGREDIENTS], mode, max_missing, offset
+
+
+def init_app(app):
+    app.extensions['recipe_ingredient_index'] = RecipeIngredientIndex()
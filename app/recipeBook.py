@@ -1,33 +1,94 @@
 import functools
+import json
+from collections import namedtuple
 from datetime import datetime
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, session, url_for, jsonify
+    Blueprint, current_app, flash, g, get_template_attribute, make_response, redirect,
+    render_template, request, session, url_for, jsonify
 )
+from markupsafe import Markup
 
-from app.db import get_db
+from app.db import RECIPE_VERSION_SQL, data_version, get_db, touch_recipes
 from app.auth import login_required, admin_required
+from app.admin_stats import (
+    ACTIVITY_TABLES, activity_series, dashboard_stats, detail_stats, parse_activity_args
+)
+from app.admin_tables import list_page
+from app.autocomplete import SUGGEST_LIMIT, SUGGEST_MAX_LIMIT, get_ingredient_index
 from app.image_handler import save_image, delete_image
+from app.ingredients import align_rows, insert_ingredients, sync_ingredients
+from app.pantry import PANTRY_PAGE_SIZE, find_by_ingredients, parse_pantry_args
+from app.cache import (
+    add_validators, cached, fill_slots, invalidate_home, invalidate_recipe, not_modified
+)
+from app.search import find_recipes, index_recipe, parse_filters, parse_sort, unindex_recipes
+from app.shopping import SHOPPING_MAX_RECIPES, build_shopping_list, parse_shopping_args
+from app.similar import similar_recipes
 
 from werkzeug.exceptions import abort
 from werkzeug.utils import secure_filename
 
 import os
+import random
 
 NB_RECIPES_FRONTPAGE = 5
+# Nombre maximal de tirages d'identifiants par recette demandée
+SAMPLE_MAX_PROBES = 4
 
 bp = Blueprint('recipeBook', __name__)
 
 
+def sample_recipes(db, count):
+    """
+    Tire au hasard jusqu'à count recettes distinctes sans parcourir la table
+
+    On tire des identifiants entre MIN(id) et MAX(id) et chaque tirage est
+    résolu par une recherche dans la clé primaire (première recette dont
+    l'id est >= au tirage), ce qui absorbe les trous laissés par les
+    suppressions. Chaque série de tirages tient en une requête et le coût ne
+    dépend que de count, pas de la taille de la table.
+    """
+    low, high = db.execute(
+        "SELECT (SELECT MIN(id) FROM recipes), (SELECT MAX(id) FROM recipes)"
+    ).fetchone()
+    if low is None:
+        return []
+
+    chosen = []
+    probes_left = count * SAMPLE_MAX_PROBES
+    while len(chosen) < count and probes_left > 0:
+        nb_probes = min(probes_left, 2 * (count - len(chosen)))
+        probes_left -= nb_probes
+        probes = [random.randint(low, high) for _ in range(nb_probes)]
+        values = ', '.join('(?)' for _ in probes)
+        found = db.execute(
+            f"""WITH probes(p) AS (VALUES {values})
+                SELECT (SELECT id FROM recipes WHERE id >= p ORDER BY id LIMIT 1) FROM probes""",
+            probes
+        ).fetchall()
+        for (recipe_id,) in found:
+            if recipe_id is not None and recipe_id not in chosen and len(chosen) < count:
+                chosen.append(recipe_id)
+
+    if not chosen:
+        return []
+    placeholders = ', '.join('?' for _ in chosen)
+    rows = db.execute(
+        f"""SELECT r.*, u.username FROM recipes r JOIN user u ON r.author_id = u.id
+            WHERE r.id IN ({placeholders})""", chosen
+    ).fetchall()
+    rows.sort(key=lambda row: chosen.index(row['id']))
+    return rows
+
+
 @bp.route('/', methods=['GET'])
 def index():
-    db = get_db()
-    list_recipes = db.execute("""
-        SELECT  r.*, u.username 
-        FROM recipes r 
-        JOIN user u ON r.author_id = u.id 
-        ORDER BY RANDOM()"""
-    ).fetchmany(NB_RECIPES_FRONTPAGE)
-    return render_template('recipe-book/index.html', recipes=list_recipes)
+    def render_grid():
+        recipe_grid = get_template_attribute('recipe-book/_recipeGrid.html', 'recipe_grid')
+        return str(recipe_grid(sample_recipes(get_db(), NB_RECIPES_FRONTPAGE)))
+
+    grid = cached(('home',), render_grid, ttl=current_app.config['PAGE_CACHE_HOME_TTL'])
+    return render_template('recipe-book/index.html', grid=Markup(grid))
 
 @bp.route('/add-recipe', methods=('POST', 'GET'))
 @login_required
@@ -87,7 +148,7 @@ def add_recipe():
             if file.filename != '':
                 image_url = save_image(file, 'recipes', optimize=True)
                 if not image_url:
-                    flash("Format d'image non valide. Utilisez PNG, JPG ou GIF.", 'error')
+                    flash("Image non valide. Utilisez PNG, JPG ou GIF, de 40 mégapixels au plus.", 'error')
         
         db = get_db()
         try:
@@ -101,35 +162,11 @@ def add_recipe():
             )
             recipe_id = cursor.lastrowid
             
-            for ing in current_ingredients:
-                if ing['name'] and ing['quantity'] and ing['unit']:
-                    existing = db.execute(
-                        'SELECT id FROM ingredient_type WHERE LOWER(name) = LOWER(?)',
-                        (ing['name'],)
-                    ).fetchone()
-        
-                    if not existing:
-                        cursor = db.execute(
-                            'INSERT INTO ingredient_type (name, image_url) VALUES (?, ?)',
-                            (ing['name'], '/static/images/default-ingredient.jpg')
-                        )
-                        ing_id = cursor.lastrowid
-                    else :
-                        ing_id = existing["id"]
-                    
-                    db.execute(
-                        "INSERT INTO ingredients (recipe_id, ingredient_id, quantity, unit) VALUES (?, ?, ?, ?)",
-                        (recipe_id, ing_id, ing['quantity'], ing['unit']),
-                    )
-            
-            for inst in current_instructions:
-                if inst['instruction']:
-                    db.execute(
-                        "INSERT INTO instructions (recipe_id, step, instruction) VALUES (?, ?, ?)",
-                        (recipe_id, inst['step'], inst['instruction']),
-                    )
-            
+            insert_ingredients(db, recipe_id, current_ingredients)
+            insert_instructions(db, recipe_id, current_instructions)
+            index_recipe(db, recipe_id)
             db.commit()
+            invalidate_home()
             flash("Recette ajoutée avec succès!", 'success')
             return redirect(url_for("recipeBook.index"))
             
@@ -162,8 +199,89 @@ def add_recipe():
                            instructions=[], 
                            is_edit=False)
 
+def insert_instructions(db, recipe_id, instructions):
+    db.executemany(
+        "INSERT INTO instructions (recipe_id, step, instruction) VALUES (?, ?, ?)",
+        [(recipe_id, inst['step'], inst['instruction']) for inst in instructions if inst['instruction']]
+    )
+
+def sync_instructions(db, recipe_id, stored, submitted):
+    """
+    Applique à une recette la liste d'étapes soumise, en n'écrivant que les
+    étapes qui changent (même principe que sync_ingredients)
+
+    Les étapes sont alignées sur leur texte ; step ne sert qu'à les ordonner
+    (les numéros affichés sont calculés à l'affichage), une étape insérée
+    reçoit donc un step entre ceux de ses voisines.
+
+    Returns:
+        bool: True si au moins une ligne a été écrite
+    """
+    wanted = [inst['instruction'] for inst in submitted if inst['instruction']]
+    updates, inserts, deletes = align_rows(
+        [(old['id'], old['step']) for old in stored], [old['instruction'] for old in stored], wanted
+    )
+    db.executemany("UPDATE instructions SET instruction = ? WHERE id = ?",
+                   [(wanted[j], row_id) for row_id, j in updates])
+    db.executemany("INSERT INTO instructions (recipe_id, step, instruction) VALUES (?, ?, ?)",
+                   [(recipe_id, step, wanted[j]) for step, j in inserts])
+    db.executemany("DELETE FROM instructions WHERE id = ?", [(row_id,) for row_id in deletes])
+    return bool(updates or inserts or deletes)
+
+def delete_recipes(db, condition, params):
+    """
+    Supprime les recettes qui vérifient condition, dans la transaction en cours
+
+    Les ingrédients, étapes, commentaires et favoris sont supprimés par le
+    trigger recipes_cascade_delete. Les images des recettes et de leurs
+    commentaires sont libérées, leurs fichiers supprimés après le commit.
+
+    Args:
+        condition: Clause WHERE sur recipes, ex. "id = ?"
+        params: Paramètres de condition
+
+    Returns:
+        list: Identifiants des recettes supprimées
+    """
+    selected = f"SELECT id FROM recipes WHERE {condition}"
+    recipe_ids = [row['id'] for row in db.execute(selected, params).fetchall()]
+    if not recipe_ids:
+        return []
+
+    images = db.execute(
+        f"""SELECT image_url FROM recipes WHERE {condition} AND image_url IS NOT NULL
+            UNION
+            SELECT image_url FROM comments WHERE recipe_id IN ({selected}) AND image_url IS NOT NULL""",
+        (*params, *params)
+    ).fetchall()
+    for row in images:
+        delete_image(row['image_url'])
+
+    unindex_recipes(db, selected, params)
+    db.execute(f"DELETE FROM recipes WHERE {condition}", params)
+    return recipe_ids
+
+def changed_fields(recipe, values):
+    """
+    Colonnes de recipes dont la valeur soumise diffère de la valeur stockée
+
+    Les valeurs du formulaire sont du texte : elles sont comparées à la
+    valeur stockée convertie en texte.
+    """
+    changed = {}
+    for column, value in values.items():
+        stored = recipe[column]
+        if stored is None or value is None:
+            same = stored == value
+        else:
+            same = str(stored) == str(value)
+        if not same:
+            changed[column] = value
+    return changed
+
 def get_recipe(id, check_author=True):
-    recipe = get_db().execute(
+    db = get_db()
+    recipe = db.execute(
         "SELECT r.*, u.username FROM recipes r JOIN user u ON r.author_id = u.id WHERE r.id = ?",
         (id,)
     ).fetchone()
@@ -174,25 +292,65 @@ def get_recipe(id, check_author=True):
     if check_author and recipe['author_id'] != g.user['id']:
         abort(403)
 
-    ingredients = get_db().execute(
-        """SELECT r.id, ing.ingredient_id, ing_t.name, quantity, unit 
-           FROM ingredients ing JOIN recipes r ON ing.recipe_id = r.id 
-           JOIN ingredient_type ing_t ON ing.ingredient_id = ing_t.id 
-           WHERE r.id = ?""", (id,)
+    ingredients = db.execute(
+        """SELECT ing.id, ing.position, ing.ingredient_id, ing_t.name, quantity, unit 
+           FROM ingredients ing JOIN ingredient_type ing_t ON ing.ingredient_id = ing_t.id 
+           WHERE ing.recipe_id = ? ORDER BY ing.position, ing.id""", (id,)
     ).fetchall()
 
-    instructions = get_db().execute(
-        "SELECT id, step, instruction FROM instructions WHERE recipe_id = ?", (id,)
+    instructions = db.execute(
+        "SELECT id, step, instruction FROM instructions WHERE recipe_id = ? ORDER BY step, id", (id,)
     ).fetchall()
 
     return recipe, ingredients, instructions
 
-def get_comments(id):
-    return get_db().execute(
-        """SELECT c.id, c.author_id, u.username, c.comment, c.grade, c.image_url
-           FROM comments c JOIN user u ON c.author_id = u.id
-           WHERE c.recipe_id = ? ORDER BY c.id DESC""", (id,)
-    ).fetchall()
+# Vue en lecture seule d'une recette et de tout ce que sa page affiche
+RecipeDetail = namedtuple('RecipeDetail', 'recipe ingredients instructions comments is_favourite')
+Ingredient = namedtuple('Ingredient', 'ingredient_id name quantity unit')
+Instruction = namedtuple('Instruction', 'step instruction')
+Comment = namedtuple('Comment', 'id author_id username comment grade image_url')
+
+def load_recipe_detail(id, user_id=None):
+    """
+    Charge en une seule requête une recette, son auteur, ses ingrédients, ses
+    étapes dans l'ordre, ses commentaires et l'état favori pour user_id
+
+    Les lignes enfants sont agrégées en JSON par SQLite puis converties en
+    tuples nommés : le résultat est immuable et peut être partagé.
+    """
+    row = get_db().execute(
+        """SELECT r.*, u.username,
+                  (SELECT json_group_array(json_object(
+                              'ingredient_id', i.ingredient_id, 'name', i.name,
+                              'quantity', i.quantity, 'unit', i.unit))
+                     FROM (SELECT ing.ingredient_id, it.name, ing.quantity, ing.unit
+                             FROM ingredients ing JOIN ingredient_type it ON ing.ingredient_id = it.id
+                            WHERE ing.recipe_id = r.id ORDER BY ing.position, ing.id) i) AS ingredients_json,
+                  (SELECT json_group_array(json_object('step', s.step, 'instruction', s.instruction))
+                     FROM (SELECT step, instruction FROM instructions
+                            WHERE recipe_id = r.id ORDER BY step, id) s) AS instructions_json,
+                  (SELECT json_group_array(json_object(
+                              'id', c.id, 'author_id', c.author_id, 'username', c.username,
+                              'comment', c.comment, 'grade', c.grade, 'image_url', c.image_url))
+                     FROM (SELECT cm.id, cm.author_id, cu.username, cm.comment, cm.grade, cm.image_url
+                             FROM comments cm JOIN user cu ON cm.author_id = cu.id
+                            WHERE cm.recipe_id = r.id ORDER BY cm.id DESC) c) AS comments_json,
+                  EXISTS (SELECT 1 FROM favourites f
+                           WHERE f.recipe_id = r.id AND f.author_id = ?) AS is_favourite
+           FROM recipes r JOIN user u ON r.author_id = u.id
+           WHERE r.id = ?""", (user_id, id)
+    ).fetchone()
+
+    if row is None:
+        abort(404, f"Recipe id {id} doesn't exist.")
+
+    return RecipeDetail(
+        recipe=row,
+        ingredients=tuple(Ingredient(**i) for i in json.loads(row['ingredients_json'])),
+        instructions=tuple(Instruction(**i) for i in json.loads(row['instructions_json'])),
+        comments=tuple(Comment(**c) for c in json.loads(row['comments_json'])),
+        is_favourite=bool(row['is_favourite']),
+    )
 
 def is_favourite(recipe_id, author_id):
     favourite = get_db().execute(
@@ -203,17 +361,69 @@ def is_favourite(recipe_id, author_id):
 
 @bp.route('/<int:id>/', methods=('POST', 'GET'))
 def see_recipe(id):
-    recipe, ingredients, instructions = get_recipe(id, False)
-    comments = get_comments(id)
-    is_fav = is_favourite(id, g.user["id"]) if g.user else False
-    return render_template("recipe-book/viewRecipe.html", recipe=recipe, ingredients=ingredients, 
-                           instructions=instructions, comments=comments, isFavourite=is_fav)
+    db = get_db()
+    row = db.execute("SELECT version, added, updated FROM recipes WHERE id = ?", (id,)).fetchone()
+    if row is None:
+        abort(404, f"Recipe id {id} doesn't exist.")
+
+    # La page dépend de la version de la recette, du dernier calcul des
+    # recettes similaires, du visiteur et de son favori
+    neighbours_version, neighbours_updated = data_version(db, 'recipe_neighbours')
+    is_fav = is_favourite(id, g.user['id']) if g.user else False
+    etag = f"recipe-{id}-{row['version']}-{neighbours_version}-{g.user['id'] if g.user else 0}-{int(is_fav)}"
+    last_modified = max(filter(None, (row['updated'] or row['added'], neighbours_updated)))
+    # Un favori ajouté ou retiré ne change pas cette date : pour un visiteur
+    # connecté, seul l'ETag permet un 304
+    response = not_modified(etag, last_modified if g.user is None else None)
+    if response is not None:
+        return response
+
+    page = get_recipe_page(id, row['version'])
+
+    # Seules ces parties dépendent du visiteur, le reste vient du cache
+    template = 'recipe-book/_recipePage.html'
+    slots = {'favourite': '', 'owner-actions': ''}
+    if g.user:
+        slots['favourite'] = get_template_attribute(template, 'favourite_button')(id, is_fav)
+        if g.user['id'] == page['author_id']:
+            slots['owner-actions'] = get_template_attribute(template, 'owner_actions')(id)
+    slots['comment-form'] = get_template_attribute(template, 'comment_form')(id, g.user is not None)
+    slots['similar'] = get_template_attribute(template, 'similar_recipes')(similar_recipes(db, id))
+
+    response = make_response(render_template(
+        "recipe-book/viewRecipe.html", title=page['title'],
+        header=Markup(page['header']), content=fill_slots(page['content'], slots)))
+    return add_validators(response, etag, last_modified, private=g.user is not None)
+
+def get_recipe_page(id, version):
+    """
+    Rendu de la page d'une recette commun à tous les visiteurs
+
+    Mis en cache sous la clé ('recipe', id, version) : la version est
+    incrémentée (touch_recipes) à chaque modification, une page périmée
+    n'est donc jamais servie, même par un autre worker.
+
+    Returns:
+        dict: title, author_id, header et content (HTML avec des <!--slot:...-->)
+    """
+    def render_page():
+        detail = load_recipe_detail(id)
+        template = 'recipe-book/_recipePage.html'
+        return {
+            'title': detail.recipe['title'],
+            'author_id': detail.recipe['author_id'],
+            'header': str(get_template_attribute(template, 'header')(detail.recipe)),
+            'content': str(get_template_attribute(template, 'content')(
+                detail.recipe, detail.ingredients, detail.instructions, detail.comments)),
+        }
+
+    return cached(('recipe', id, version), render_page)
 
 @bp.route('/<int:id>/comment/<int:cid>/delete', methods=('POST',))
 @login_required
 def delete_comment(id, cid):
     db = get_db()
-    comment = db.execute("SELECT author_id, image_url FROM comments WHERE id = ?", (cid,)).fetchone()
+    comment = db.execute("SELECT author_id, recipe_id, image_url FROM comments WHERE id = ?", (cid,)).fetchone()
     
     if comment is None:
         abort(404)
@@ -224,7 +434,9 @@ def delete_comment(id, cid):
         delete_image(comment['image_url'])
 
     db.execute("DELETE FROM comments WHERE id = ?", (cid,))
+    touch_recipes(db, "id = ?", (comment['recipe_id'],))
     db.commit()
+    invalidate_recipe(id)
     flash("Commentaire supprimé !", "success")
     return redirect(url_for('recipeBook.see_recipe', id=id))
 
@@ -307,31 +519,28 @@ def edit_recipe(id):
         
         db = get_db()
         try:
-            db.execute(
-                """UPDATE recipes SET title=?, description=?, notes=?, author_grade=?, 
-                   prepTime=?, cookTime=?, servings=?, difficulty=?, image_url=?, category=? WHERE id=?""",
-                (form_data['title'], form_data['description'], form_data['notes'], form_data['author_grade'], 
-                 form_data['prepTime'], form_data['cookTime'], form_data['servings'], 
-                 form_data['difficulty'], image_url, form_data['category'], id)
-            )
-
-            db.execute("DELETE FROM ingredients WHERE recipe_id = ?", (id,))
-            for ing in current_ingredients:
-                existing = db.execute('SELECT id FROM ingredient_type WHERE LOWER(name)=LOWER(?)', (ing['name'],)).fetchone()
-                ing_id = existing['id'] if existing else db.execute('INSERT INTO ingredient_type (name) VALUES (?)', (ing['name'],)).lastrowid
-                db.execute("INSERT INTO ingredients (recipe_id, ingredient_id, quantity, unit) VALUES (?,?,?,?)",
-                           (id, ing_id, ing['quantity'], ing['unit']))
-
-            db.execute("DELETE FROM instructions WHERE recipe_id = ?", (id,))
-            for inst in current_instructions:
-                db.execute("INSERT INTO instructions (recipe_id, step, instruction) VALUES (?,?,?)",
-                           (id, inst['step'], inst['instruction']))
-
-            db.commit()
+            # Seuls les champs et les lignes modifiés sont écrits : une
+            # simple correction du titre ne touche ni les ingrédients ni les étapes
+            changed = changed_fields(recipe_db, {**form_data, 'image_url': image_url})
+            ingredients_changed = sync_ingredients(db, id, ingredients_db, current_ingredients)
+            instructions_changed = sync_instructions(db, id, instructions_db, current_instructions)
+
+            if changed or ingredients_changed or instructions_changed:
+                # Une seule écriture de la recette : champs modifiés et nouvelle version
+                assignments = ''.join(f'{column} = ?, ' for column in changed)
+                db.execute(f"UPDATE recipes SET {assignments}{RECIPE_VERSION_SQL} WHERE id = ?",
+                           (*changed.values(), id))
+                index_recipe(db, id)
+                db.commit()
+                invalidate_recipe(id)
+                invalidate_home()
             flash("Recette mise à jour !", 'success')
             return redirect(url_for('recipeBook.see_recipe', id=id))
         except Exception as e:
             db.rollback()
+            # Nouvelle image jamais référencée : supprimée en fin de requête
+            if image_url and image_url != recipe_db['image_url']:
+                delete_image(image_url)
             flash(f"Erreur : {str(e)}", 'error')
 
     return render_template('recipe-book/addRecipe.html', recipe=recipe_db, 
@@ -341,13 +550,12 @@ def edit_recipe(id):
 @login_required
 def delete_recipe(id):
     db = get_db()
-    recipe = db.execute("SELECT author_id, image_url FROM recipes WHERE id = ?", (id,)).fetchone()
+    recipe = db.execute("SELECT author_id FROM recipes WHERE id = ?", (id,)).fetchone()
     if recipe and recipe['author_id'] == g.user["id"]:
-        if recipe['image_url']: delete_image(recipe['image_url'])
-        db.execute("DELETE FROM recipes WHERE id = ?", (id,))
-        db.execute("DELETE FROM ingredients WHERE recipe_id = ?", (id,))
-        db.execute("DELETE FROM instructions WHERE recipe_id = ?", (id,))
+        delete_recipes(db, "id = ?", (id,))
         db.commit()
+        invalidate_recipe(id)
+        invalidate_home()
         flash("Recette supprimée.", "success")
     return redirect(url_for('recipeBook.index'))
 
@@ -356,18 +564,151 @@ def load_logged_in_user():
     user_id = session.get('user_id')
     g.user = get_db().execute('SELECT * FROM user WHERE id = ?', (user_id,)).fetchone() if user_id else None
 
+def recipe_search():
+    # Paramètres et page de résultats communs à la recherche et à son API
+    q = request.args.get('q', '').strip()
+    sort = parse_sort(request.args, q)
+    page = find_recipes(get_db(), q, parse_filters(request.args), cursor=request.args.get('after'), sort=sort)
+    return q, sort, page
+
 @bp.route('/search', methods=['GET'])
 def search_recipes():
-    db = get_db()
-    q = request.args.get('q', '').strip()
-    # Logique simplifiée pour l'exemple, conservez votre bloc SQL dynamique ici
-    recipes = db.execute("SELECT r.*, u.username FROM recipes r JOIN user u ON r.author_id = u.id WHERE r.title LIKE ?", (f'%{q}%',)).fetchall()
-    return render_template('recipe-book/search.html', recipes=recipes, search_query=q)
+    q, sort, page = recipe_search()
+
+    next_url = None
+    if page.next_cursor:
+        args = request.args.to_dict()
+        args['after'] = page.next_cursor
+        next_url = url_for('recipeBook.search_recipes', **args)
+
+    return render_template('recipe-book/search.html',
+                           recipes=page.recipes,
+                           search_query=q,
+                           sort=sort,
+                           difficulty=request.args.get('difficulty', ''),
+                           max_prep_time=request.args.get('max_prep_time', ''),
+                           max_cook_time=request.args.get('max_cook_time', ''),
+                           min_servings=request.args.get('min_servings', ''),
+                           min_rating=request.args.get('min_rating', ''),
+                           total_results=page.total,
+                           total_capped=page.total_capped,
+                           next_url=next_url)
+
+@bp.route('/api/recipes/search', methods=['GET'])
+def search_recipes_api():
+    _, _, page = recipe_search()
+    fields = ('id', 'title', 'description', 'username', 'image_url', 'difficulty', 'prepTime', 'cookTime',
+              'servings', 'author_grade')
+    return jsonify({
+        'recipes': [{**{key: recipe[key] for key in fields},
+                     'url': url_for('recipeBook.see_recipe', id=recipe['id'])} for recipe in page.recipes],
+        'total': page.total,
+        'total_capped': page.total_capped,
+        'next_cursor': page.next_cursor,
+    })
+
+def pantry_search():
+    # Paramètres et résultats communs à la page et à l'API "avec ce que j'ai"
+    ingredient_ids, mode, max_missing, offset = parse_pantry_args(request.args)
+    page = find_by_ingredients(get_db(), ingredient_ids, mode, max_missing, offset)
+    next_offset = offset + PANTRY_PAGE_SIZE if page.total > offset + PANTRY_PAGE_SIZE else None
+    return ingredient_ids, mode, max_missing, page, next_offset
+
+@bp.route('/search/ingredients', methods=['GET'])
+def search_by_ingredients():
+    ingredient_ids, mode, max_missing, page, next_offset = pantry_search()
+    selected = []
+    if ingredient_ids:
+        placeholders = ', '.join('?' for _ in ingredient_ids)
+        selected = get_db().execute(
+            f"SELECT id, name FROM ingredient_type WHERE id IN ({placeholders}) ORDER BY name", ingredient_ids
+        ).fetchall()
+
+    next_url = None
+    if next_offset is not None:
+        args = request.args.to_dict(flat=False)
+        args['offset'] = next_offset
+        next_url = url_for('recipeBook.search_by_ingredients', **args)
+
+    return render_template('recipe-book/pantry.html',
+                           recipes=page.recipes,
+                           total_results=page.total,
+                           selected=selected,
+                           mode=mode,
+                           max_missing=max_missing,
+                           next_url=next_url)
+
+@bp.route('/api/recipes/by-ingredients', methods=['GET'])
+def recipes_by_ingredients_api():
+    _, _, _, page, next_offset = pantry_search()
+    fields = ('id', 'title', 'username', 'difficulty', 'prepTime', 'cookTime', 'author_grade',
+              'matched', 'size', 'missing')
+    return jsonify({
+        'recipes': [{**{key: recipe[key] for key in fields},
+                     'url': url_for('recipeBook.see_recipe', id=recipe['id'])} for recipe in page.recipes],
+        'total': page.total,
+        'next_offset': next_offset,
+    })
+
+def shopping_list():
+    # Recettes demandées, ou par défaut les favoris du visiteur connecté
+    recipe_ids, servings = parse_shopping_args(request.args)
+    favourites = []
+    if g.user:
+        favourites = get_db().execute(
+            """SELECT r.id, r.title, r.servings FROM favourites f JOIN recipes r ON r.id = f.recipe_id
+               WHERE f.author_id = ? ORDER BY r.title""", (g.user['id'],)
+        ).fetchall()
+        if not recipe_ids and 'recipe' not in request.args:
+            recipe_ids = [recipe['id'] for recipe in favourites][:SHOPPING_MAX_RECIPES]
+    return favourites, servings, build_shopping_list(get_db(), recipe_ids, servings)
+
+@bp.route('/shopping-list', methods=['GET'])
+def shopping_list_page():
+    favourites, servings, shopping = shopping_list()
+    # Les recettes demandées hors des favoris restent proposées dans le formulaire
+    favourite_ids = {recipe['id'] for recipe in favourites}
+    choices = list(favourites) + [recipe for recipe in shopping.recipes if recipe['id'] not in favourite_ids]
+    return render_template('recipe-book/shopping.html',
+                           choices=choices,
+                           selected={recipe['id'] for recipe in shopping.recipes},
+                           servings=servings,
+                           items=shopping.items)
+
+@bp.route('/api/shopping-list', methods=['GET'])
+def shopping_list_api():
+    _, servings, shopping = shopping_list()
+    return jsonify({
+        'recipes': [{'id': recipe['id'], 'title': recipe['title'], 'servings': recipe['servings']}
+                    for recipe in shopping.recipes],
+        'servings': servings,
+        'items': shopping.items,
+    })
 
 @bp.route('/api/ingredients', methods=['GET'])
 def get_ingredients():
-    ingredients = get_db().execute('SELECT id, name FROM ingredient_type ORDER BY name ASC').fetchall()
-    return jsonify([{'id': i['id'], 'name': i['name']} for i in ingredients])
+    db = get_db()
+    version, last_modified = data_version(db, 'ingredient_type')
+    etag = f"ingredients-{version}"
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+
+    ingredients = db.execute('SELECT id, name FROM ingredient_type ORDER BY name ASC').fetchall()
+    response = jsonify([{'id': i['id'], 'name': i['name']} for i in ingredients])
+    return add_validators(response, etag, last_modified)
+
+@bp.route('/api/ingredients/suggest', methods=['GET'])
+def suggest_ingredients():
+    """Typeahead: ingredients with a word starting with q, most used first"""
+    limit = min(request.args.get('limit', SUGGEST_LIMIT, type=int), SUGGEST_MAX_LIMIT)
+    index = get_ingredient_index()
+    index.refresh(get_db())
+    response = jsonify(index.suggest(request.args.get('q', ''), max(limit, 1)))
+    # Une suggestion vieille d'une minute reste utile, et chaque frappe est une requête
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
 
 @bp.route('/api/toggle_favourites/<int:id>', methods=['POST'])
 @login_required
@@ -394,7 +735,9 @@ def add_comment(id):
     if comment and grade:
         db.execute("INSERT INTO comments (recipe_id, author_id, comment, grade, image_url) VALUES (?,?,?,?,?)",
                    (id, g.user['id'], comment, grade, image_url))
+        touch_recipes(db, "id = ?", (id,))
         db.commit()
+        invalidate_recipe(id)
         flash("Commentaire ajouté !", 'success')
     return redirect(url_for('recipeBook.see_recipe', id=id))
 
@@ -403,78 +746,49 @@ def add_comment(id):
 @admin_required
 def admin_page():
     """Display admin dashboard with statistics and management options"""
-    db = get_db()
-    
-    # Get statistics
-    stats = {
-        'total_users': db.execute('SELECT COUNT(*) as count FROM user').fetchone()['count'],
-        'total_recipes': db.execute('SELECT COUNT(*) as count FROM recipes').fetchone()['count'],
-        'total_comments': db.execute('SELECT COUNT(*) as count FROM comments').fetchone()['count'],
-        'total_ingredients': db.execute('SELECT COUNT(*) as count FROM ingredient_type').fetchone()['count'],
-        'total_favourites': db.execute('SELECT COUNT(*) as count FROM favourites').fetchone()['count'],
+    dashboard, _, _ = dashboard_stats(get_db())
+    # Les listes de gestion (utilisateurs, recettes, commentaires) sont
+    # chargées par la page, onglet par onglet, via admin_list_api
+    return render_template('recipe-book/admin.html', **dashboard)
+
+def admin_item_urls(name, item):
+    """Liens et actions d'une ligne des listes de gestion"""
+    if name == 'users':
+        return {
+            'toggle_admin': url_for('recipeBook.toggle_user_admin', user_id=item['id']),
+            'delete': url_for('recipeBook.delete_user', user_id=item['id']),
+        }
+    if name == 'recipes':
+        return {
+            'view': url_for('recipeBook.see_recipe', id=item['id']),
+            'delete': url_for('recipeBook.admin_delete_recipe', recipe_id=item['id']),
+        }
+    return {
+        'recipe': url_for('recipeBook.see_recipe', id=item['recipe_id']),
+        'delete': url_for('recipeBook.admin_delete_comment', comment_id=item['id']),
     }
-    
-    # Get recent recipes
-    recent_recipes = db.execute("""
-        SELECT r.id, r.title, u.username, r.added, r.author_grade
-        FROM recipes r
-        JOIN user u ON r.author_id = u.id
-        ORDER BY r.added DESC
-        LIMIT 10
-    """).fetchall()
-    
-    # Get recent comments
-    recent_comments = db.execute("""
-        SELECT c.id, c.comment, u.username, c.grade, r.title, c.recipe_id
-        FROM comments c
-        JOIN user u ON c.author_id = u.id
-        JOIN recipes r ON c.recipe_id = r.id
-        ORDER BY c.id DESC
-        LIMIT 10
-    """).fetchall()
-    
-    # Get most rated recipes
-    top_recipes = db.execute("""
-        SELECT r.id, r.title, u.username, r.author_grade, COUNT(c.id) as comment_count
-        FROM recipes r
-        JOIN user u ON r.author_id = u.id
-        LEFT JOIN comments c ON r.id = c.recipe_id
-        GROUP BY r.id
-        ORDER BY r.author_grade DESC
-        LIMIT 10
-    """).fetchall()
-    
-    # Get most active users
-    active_users = db.execute("""
-        SELECT u.id, u.username, COUNT(r.id) as recipe_count, COUNT(c.id) as comment_count
-        FROM user u
-        LEFT JOIN recipes r ON u.id = r.author_id
-        LEFT JOIN comments c ON u.id = c.author_id
-        GROUP BY u.id
-        ORDER BY (COUNT(r.id) + COUNT(c.id)) DESC
-        LIMIT 10
-    """).fetchall()
-    
-    # Get all users for management
-    all_users = db.execute("""
-        SELECT u.id, u.username, 
-               COUNT(DISTINCT r.id) as recipe_count,
-               COUNT(DISTINCT c.id) as comment_count,
-               COALESCE(u.is_admin, 0) as is_admin
-        FROM user u
-        LEFT JOIN recipes r ON u.id = r.author_id
-        LEFT JOIN comments c ON u.id = c.author_id
-        GROUP BY u.id
-        ORDER BY u.username
-    """).fetchall()
-    
-    return render_template('admin.html', 
-                         stats=stats,
-                         recent_recipes=recent_recipes,
-                         recent_comments=recent_comments,
-                         top_recipes=top_recipes,
-                         active_users=active_users,
-                         all_users=all_users)
+
+@bp.route('/admin/api/<any(users, recipes, comments):name>', methods=['GET'])
+@login_required
+@admin_required
+def admin_list_api(name):
+    """Paginated, sortable and filterable admin management list"""
+    items, next_cursor = list_page(
+        get_db(), name,
+        q=request.args.get('q', '').strip(),
+        sort=request.args.get('sort'),
+        order=request.args.get('order'),
+        cursor=request.args.get('after'),
+    )
+    for item in items:
+        item['urls'] = admin_item_urls(name, item)
+        if name == 'users':
+            item['is_self'] = item['id'] == g.user['id']
+
+    response = jsonify({'items': items, 'next_cursor': next_cursor})
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @bp.route('/admin/users/<int:user_id>/toggle-admin', methods=['POST'])
 @login_required
@@ -517,29 +831,26 @@ def delete_user(user_id):
         abort(404)
     
     try:
-        # Delete user's recipes and related content
-        recipes = db.execute('SELECT id, image_url FROM recipes WHERE author_id = ?', (user_id,)).fetchall()
-        for recipe in recipes:
-            if recipe['image_url']:
-                delete_image(recipe['image_url'])
-            db.execute('DELETE FROM ingredients WHERE recipe_id = ?', (recipe['id'],))
-            db.execute('DELETE FROM instructions WHERE recipe_id = ?', (recipe['id'],))
-        
-        # Delete user's comments
-        comments = db.execute('SELECT image_url FROM comments WHERE author_id = ?', (user_id,)).fetchall()
+        # Recipes with their children, comments, favourites and images
+        recipe_ids = delete_recipes(db, 'author_id = ?', (user_id,))
+
+        # Pages of other recipes the user commented on
+        comments = db.execute(
+            'SELECT recipe_id, image_url FROM comments WHERE author_id = ?', (user_id,)
+        ).fetchall()
         for comment in comments:
             if comment['image_url']:
                 delete_image(comment['image_url'])
-        
-        # Delete recipes first due to foreign key constraints
-        db.execute('DELETE FROM recipes WHERE author_id = ?', (user_id,))
-        db.execute('DELETE FROM comments WHERE author_id = ?', (user_id,))
-        db.execute('DELETE FROM favourites WHERE author_id = ?', (user_id,))
-        
-        # Finally delete the user
+
+        touch_recipes(db, 'id IN (SELECT recipe_id FROM comments WHERE author_id = ?)', (user_id,))
+
+        # Comments and favourites go with the user (user_cascade_delete)
         db.execute('DELETE FROM user WHERE id = ?', (user_id,))
         db.commit()
         
+        for recipe_id in set(recipe_ids) | {row['recipe_id'] for row in comments}:
+            invalidate_recipe(recipe_id)
+        invalidate_home()
         flash("Utilisateur et tous ses contenus supprimés.", 'success')
     except Exception as e:
         db.rollback()
@@ -562,7 +873,9 @@ def admin_delete_comment(comment_id):
         delete_image(comment['image_url'])
     
     db.execute('DELETE FROM comments WHERE id = ?', (comment_id,))
+    touch_recipes(db, 'id = ?', (comment['recipe_id'],))
     db.commit()
+    invalidate_recipe(comment['recipe_id'])
     
     flash("Commentaire supprimé par l'administrateur.", 'success')
     return redirect(url_for('recipeBook.admin_page'))
@@ -573,20 +886,16 @@ def admin_delete_comment(comment_id):
 def admin_delete_recipe(recipe_id):
     """Admin deletion of a recipe"""
     db = get_db()
-    recipe = db.execute('SELECT image_url FROM recipes WHERE id = ?', (recipe_id,)).fetchone()
+    recipe = db.execute('SELECT id FROM recipes WHERE id = ?', (recipe_id,)).fetchone()
     
     if recipe is None:
         abort(404)
     
     try:
-        if recipe['image_url']:
-            delete_image(recipe['image_url'])
-        
-        db.execute('DELETE FROM ingredients WHERE recipe_id = ?', (recipe_id,))
-        db.execute('DELETE FROM instructions WHERE recipe_id = ?', (recipe_id,))
-        db.execute('DELETE FROM comments WHERE recipe_id = ?', (recipe_id,))
-        db.execute('DELETE FROM recipes WHERE id = ?', (recipe_id,))
+        delete_recipes(db, 'id = ?', (recipe_id,))
         db.commit()
+        invalidate_recipe(recipe_id)
+        invalidate_home()
         
         flash("Recette supprimée par l'administrateur.", 'success')
     except Exception as e:
@@ -601,33 +910,32 @@ def admin_delete_recipe(recipe_id):
 def admin_stats_api():
     """API endpoint for detailed statistics"""
     db = get_db()
-    
-    # Recipes by category (if category exists)
-    recipes_by_difficulty = db.execute("""
-        SELECT difficulty, COUNT(*) as count
-        FROM recipes
-        GROUP BY difficulty
-        ORDER BY difficulty
-    """).fetchall()
-    
-    # Average recipe ratings
-    avg_rating = db.execute("""
-        SELECT AVG(author_grade) as avg_rating
-        FROM recipes
-    """).fetchone()
-    
-    # Comments statistics
-    comments_stats = db.execute("""
-        SELECT 
-            AVG(grade) as avg_grade,
-            COUNT(*) as total,
-            MAX(grade) as max_grade,
-            MIN(grade) as min_grade
-        FROM comments
-    """).fetchone()
-    
-    return jsonify({
-        'recipes_by_difficulty': [dict(row) for row in recipes_by_difficulty],
-        'avg_recipe_rating': dict(avg_rating),
-        'comments_stats': dict(comments_stats)
-    })
\ No newline at end of file
+    stats, version, last_modified = detail_stats(db)
+    etag = f"stats-{version}"
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+
+    response = jsonify(stats)
+    return add_validators(response, etag, last_modified, private=True)
+
+@bp.route('/admin/stats/activity', methods=['GET'])
+@login_required
+@admin_required
+def admin_activity_api():
+    """Time series of signups, recipes, comments and favourites per day or week"""
+    try:
+        start, end, bucket, metrics = parse_activity_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    db = get_db()
+    version, last_modified = data_version(db, *ACTIVITY_TABLES)
+    # La version couvre les données, les paramètres distinguent les séries
+    etag = f"activity-{version}-{start}-{end}-{bucket}-{','.join(metrics)}"
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+
+    response = jsonify(activity_series(db, start, end, bucket, metrics))
+    return add_validators(response, etag, last_modified, private=True)
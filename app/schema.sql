@@ -1,3 +1,6 @@
+-- Schéma complet d'une nouvelle base (init-db). Toute évolution doit aussi être
+-- livrée sous forme de migration dans app/migrations pour les bases existantes.
+
 DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS product;
 DROP TABLE IF EXISTS recipes;
@@ -6,13 +9,20 @@ DROP TABLE IF EXISTS ingredients;
 DROP TABLE IF EXISTS instructions;
 DROP TABLE IF EXISTS comments;
 DROP TABLE IF EXISTS favourites;
+DROP TABLE IF EXISTS recipes_fts;
+DROP TABLE IF EXISTS data_versions;
+DROP TABLE IF EXISTS images;
+DROP TABLE IF EXISTS recipe_stats;
+DROP TABLE IF EXISTS activity_daily;
+DROP TABLE IF EXISTS recipe_neighbours;
+DROP TABLE IF EXISTS deleted_recipes;
 
 CREATE TABLE user (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   username TEXT UNIQUE NOT NULL,
   password TEXT NOT NULL,
   security_question TEXT NOT NULL,
-  security_answer TEXT NOT NULL
+  security_answer TEXT NOT NULL,
   is_admin INTEGER DEFAULT 0
 );
 
@@ -30,33 +40,56 @@ CREATE TABLE recipes ( -- Recettes
     difficulty INTEGER DEFAULT 0,
     category INTEGER DEFAULT -1,
     image_url TEXT DEFAULT NULL,
+    version INTEGER NOT NULL DEFAULT 0, -- incrémentée par app.db.touch_recipes
+    updated TIMESTAMP DEFAULT NULL, -- dernière modification, NULL si aucune depuis added
     FOREIGN KEY (author_id) REFERENCES user (id)
 );
 
+-- Index couvrants pour la recherche (app.search) : tri par date + filtres,
+-- avec ou sans filtre d'égalité sur la difficulté
+CREATE INDEX idx_recipes_added ON recipes (added, id, difficulty, prepTime, cookTime, servings, author_grade);
+CREATE INDEX idx_recipes_difficulty ON recipes (difficulty, added, id, prepTime, cookTime, servings, author_grade);
+CREATE INDEX idx_recipes_author ON recipes (author_id);
+CREATE INDEX idx_recipes_title ON recipes (title); -- tri des listes admin
+CREATE INDEX idx_recipes_updated ON recipes (updated); -- mises à jour de app.pantry
+-- Tris de la recherche (app.search.SEARCH_SORTS), départagés par id
+CREATE INDEX idx_recipes_grade ON recipes (author_grade, id);
+CREATE INDEX idx_recipes_prep_time ON recipes (prepTime, id);
+CREATE INDEX idx_recipes_total_time ON recipes (prepTime + cookTime, id);
+
 CREATE TABLE ingredient_type (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   name TEXT NOT NULL,
-  image_url TEXT 
+  image_url TEXT ,
+  normalized_name TEXT -- app.ingredients.normalize_name(name)
 );
 
+CREATE UNIQUE INDEX idx_ingredient_type_normalized_name ON ingredient_type (normalized_name);
+
 CREATE TABLE ingredients (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   recipe_id INTEGER NOT NULL,
   ingredient_id INTEGER NOT NULL,
   quantity REAL NOT NULL,
   unit TEXT NOT NULL, -- g, ml, pieces of, teaspoons
+  position REAL NOT NULL DEFAULT 0, -- ordre d'affichage (app.ingredients.align_rows)
   FOREIGN KEY (recipe_id) REFERENCES recipes (id),
   FOREIGN KEY (ingredient_id) REFERENCES ingredient_type (id)
 );
 
+CREATE INDEX idx_ingredients_recipe ON ingredients (recipe_id, position);
+CREATE INDEX idx_ingredients_type ON ingredients (ingredient_id); -- utilisations par type (app.autocomplete)
+
 CREATE TABLE instructions (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   recipe_id INTEGER NOT NULL,
-  step INTEGER NOT NULL,
+  step INTEGER NOT NULL, -- ordre d'affichage, pas forcément entier (app.ingredients.align_rows)
   instruction TEXT NOT NULL,
   FOREIGN KEY (recipe_id) REFERENCES recipes (id)
 );
 
+CREATE INDEX idx_instructions_recipe ON instructions (recipe_id, step);
+
 CREATE TABLE comments (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   recipe_id INTEGER NOT NULL,
@@ -68,10 +101,289 @@ CREATE TABLE comments (
   FOREIGN KEY (recipe_id) REFERENCES recipes (id)
 );
 
+CREATE INDEX idx_comments_recipe ON comments (recipe_id, id);
+CREATE INDEX idx_comments_author ON comments (author_id);
+
 CREATE TABLE favourites (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   author_id INTEGER NOT NULL,
   recipe_id INTEGER NOT NULL,
   FOREIGN KEY (author_id) REFERENCES user (id),
   FOREIGN KEY (recipe_id) REFERENCES recipes (id)
-);
\ No newline at end of file
+);
+
+CREATE UNIQUE INDEX idx_favourites_author_recipe ON favourites (author_id, recipe_id);
+CREATE INDEX idx_favourites_recipe ON favourites (recipe_id);
+
+-- Index plein texte des recettes (rowid = recipes.id), tenu à jour par app.search
+-- remove_diacritics : "creme" trouve "crème"
+CREATE VIRTUAL TABLE recipes_fts USING fts5(
+  title,
+  description,
+  notes,
+  instructions,
+  ingredients,
+  tokenize = 'unicode61 remove_diacritics 2',
+  prefix = '2 3'
+);
+-- Pondération BM25 par colonne, voir app.search.BM25_WEIGHTS
+INSERT INTO recipes_fts (recipes_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0, 1.0, 3.0)');
+
+-- recipes.version (clé du cache des pages, app.cache, et ETag) et
+-- recipes.updated sont mis à jour par l'application, une fois par écriture
+-- de la recette ou de ses lignes enfants (app.db.touch_recipes)
+
+-- Compteur de modifications par table, incrémenté par les triggers
+-- *_data_version_* (validation HTTP des réponses qui portent sur toute une table)
+CREATE TABLE data_versions (
+  name TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0,
+  updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO data_versions (name) VALUES ('recipes'), ('comments'), ('ingredient_type'), ('user'), ('favourites'),
+  ('recipe_neighbours'), ('ingredient_type_edits');
+
+CREATE TRIGGER recipes_data_version_insert AFTER INSERT ON recipes
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'recipes';
+END;
+CREATE TRIGGER recipes_data_version_update AFTER UPDATE ON recipes
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'recipes';
+END;
+CREATE TRIGGER recipes_data_version_delete AFTER DELETE ON recipes
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'recipes';
+END;
+CREATE TRIGGER comments_data_version_insert AFTER INSERT ON comments
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'comments';
+END;
+CREATE TRIGGER comments_data_version_update AFTER UPDATE ON comments
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'comments';
+END;
+CREATE TRIGGER comments_data_version_delete AFTER DELETE ON comments
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'comments';
+END;
+-- Les insertions dans ingredient_type sont comptées une fois par lot par
+-- app.ingredients.resolve_ingredient_types ; renommages et suppressions le
+-- sont aussi dans ingredient_type_edits (reconstruction de app.autocomplete)
+CREATE TRIGGER ingredient_type_data_version_update AFTER UPDATE ON ingredient_type
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP
+  WHERE name IN ('ingredient_type', 'ingredient_type_edits');
+END;
+CREATE TRIGGER ingredient_type_data_version_delete AFTER DELETE ON ingredient_type
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP
+  WHERE name IN ('ingredient_type', 'ingredient_type_edits');
+END;
+CREATE TRIGGER user_data_version_insert AFTER INSERT ON user
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'user';
+END;
+CREATE TRIGGER user_data_version_update AFTER UPDATE ON user
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'user';
+END;
+CREATE TRIGGER user_data_version_delete AFTER DELETE ON user
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'user';
+END;
+CREATE TRIGGER favourites_data_version_insert AFTER INSERT ON favourites
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'favourites';
+END;
+CREATE TRIGGER favourites_data_version_update AFTER UPDATE ON favourites
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'favourites';
+END;
+CREATE TRIGGER favourites_data_version_delete AFTER DELETE ON favourites
+BEGIN
+  UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP WHERE name = 'favourites';
+END;
+
+-- Références aux fichiers images (app.image_handler)
+CREATE TABLE images ( -- Nombre de lignes (recettes, commentaires) qui référencent chaque fichier
+  url TEXT PRIMARY KEY, -- valeur de image_url
+  refcount INTEGER NOT NULL
+);
+
+CREATE TRIGGER recipes_images_insert AFTER INSERT ON recipes
+WHEN NEW.image_url IS NOT NULL
+BEGIN
+  INSERT INTO images (url, refcount) VALUES (NEW.image_url, 1)
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER recipes_images_update AFTER UPDATE OF image_url ON recipes
+WHEN NEW.image_url IS NOT OLD.image_url
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+  INSERT INTO images (url, refcount) SELECT NEW.image_url, 1 WHERE NEW.image_url IS NOT NULL
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER recipes_images_delete AFTER DELETE ON recipes
+WHEN OLD.image_url IS NOT NULL
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+END;
+CREATE TRIGGER comments_images_insert AFTER INSERT ON comments
+WHEN NEW.image_url IS NOT NULL
+BEGIN
+  INSERT INTO images (url, refcount) VALUES (NEW.image_url, 1)
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER comments_images_update AFTER UPDATE OF image_url ON comments
+WHEN NEW.image_url IS NOT OLD.image_url
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+  INSERT INTO images (url, refcount) SELECT NEW.image_url, 1 WHERE NEW.image_url IS NOT NULL
+  ON CONFLICT (url) DO UPDATE SET refcount = refcount + 1;
+END;
+CREATE TRIGGER comments_images_delete AFTER DELETE ON comments
+WHEN OLD.image_url IS NOT NULL
+BEGIN
+  UPDATE images SET refcount = refcount - 1 WHERE url = OLD.image_url;
+  DELETE FROM images WHERE url = OLD.image_url AND refcount <= 0;
+END;
+
+CREATE TABLE recipe_stats ( -- Agrégats par recette, tenus à jour par les triggers *_stats_*
+  recipe_id INTEGER PRIMARY KEY,
+  comment_count INTEGER NOT NULL DEFAULT 0,
+  grade_sum INTEGER NOT NULL DEFAULT 0,
+  favourite_count INTEGER NOT NULL DEFAULT 0,
+  avg_grade REAL GENERATED ALWAYS AS (
+    CASE WHEN comment_count > 0 THEN CAST(grade_sum AS REAL) / comment_count END
+  ) STORED, -- note moyenne des commentaires, NULL sans commentaire
+  FOREIGN KEY (recipe_id) REFERENCES recipes (id)
+);
+
+-- Classement par note de la communauté, puis par nombre d'avis
+CREATE INDEX idx_recipe_stats_avg_grade ON recipe_stats (avg_grade DESC, comment_count DESC);
+CREATE INDEX idx_recipe_stats_favourites ON recipe_stats (favourite_count DESC);
+CREATE INDEX idx_recipe_stats_popularity ON recipe_stats (favourite_count, recipe_id); -- tri de la recherche
+-- MIN(grade) / MAX(grade) des statistiques admin
+CREATE INDEX idx_comments_grade ON comments (grade);
+
+CREATE TRIGGER recipes_stats_insert AFTER INSERT ON recipes
+BEGIN
+  INSERT INTO recipe_stats (recipe_id) VALUES (NEW.id);
+END;
+CREATE TRIGGER recipes_stats_delete AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM recipe_stats WHERE recipe_id = OLD.id;
+END;
+
+CREATE TRIGGER comments_stats_insert AFTER INSERT ON comments
+BEGIN
+  UPDATE recipe_stats SET comment_count = comment_count + 1, grade_sum = grade_sum + NEW.grade
+  WHERE recipe_id = NEW.recipe_id;
+END;
+CREATE TRIGGER comments_stats_update AFTER UPDATE OF recipe_id, grade ON comments
+BEGIN
+  UPDATE recipe_stats SET comment_count = comment_count - 1, grade_sum = grade_sum - OLD.grade
+  WHERE recipe_id = OLD.recipe_id;
+  UPDATE recipe_stats SET comment_count = comment_count + 1, grade_sum = grade_sum + NEW.grade
+  WHERE recipe_id = NEW.recipe_id;
+END;
+CREATE TRIGGER comments_stats_delete AFTER DELETE ON comments
+BEGIN
+  UPDATE recipe_stats SET comment_count = comment_count - 1, grade_sum = grade_sum - OLD.grade
+  WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER favourites_stats_insert AFTER INSERT ON favourites
+BEGIN
+  UPDATE recipe_stats SET favourite_count = favourite_count + 1 WHERE recipe_id = NEW.recipe_id;
+END;
+CREATE TRIGGER favourites_stats_delete AFTER DELETE ON favourites
+BEGIN
+  UPDATE recipe_stats SET favourite_count = favourite_count - 1 WHERE recipe_id = OLD.recipe_id;
+END;
+
+-- Suppressions en cascade (équivalent de ON DELETE CASCADE, sans reconstruire
+-- les tables) : une recette emporte ses lignes enfants, ses commentaires et
+-- ses favoris ; un utilisateur ses recettes, commentaires et favoris
+CREATE TRIGGER recipes_cascade_delete AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM ingredients WHERE recipe_id = OLD.id;
+  DELETE FROM instructions WHERE recipe_id = OLD.id;
+  DELETE FROM comments WHERE recipe_id = OLD.id;
+  DELETE FROM favourites WHERE recipe_id = OLD.id;
+END;
+
+CREATE TRIGGER user_cascade_delete AFTER DELETE ON user
+BEGIN
+  DELETE FROM favourites WHERE author_id = OLD.id;
+  DELETE FROM comments WHERE author_id = OLD.id;
+  DELETE FROM recipes WHERE author_id = OLD.id;
+END;
+
+-- Activité par jour (UTC) pour les séries temporelles de l'administration
+-- (app.admin_stats.activity_series). Les suppressions ne sont pas décomptées :
+-- ce sont des ajouts par jour.
+CREATE TABLE activity_daily (
+  metric TEXT NOT NULL, -- signups, recipes, comments, favourites
+  day TEXT NOT NULL, -- YYYY-MM-DD
+  count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (metric, day)
+) WITHOUT ROWID;
+
+CREATE TRIGGER user_activity_insert AFTER INSERT ON user
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('signups', date('now'), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER recipes_activity_insert AFTER INSERT ON recipes
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('recipes', date(NEW.added), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER comments_activity_insert AFTER INSERT ON comments
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('comments', date('now'), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER favourites_activity_insert AFTER INSERT ON favourites
+BEGIN
+  INSERT INTO activity_daily (metric, day, count) VALUES ('favourites', date('now'), 1)
+  ON CONFLICT (metric, day) DO UPDATE SET count = count + 1;
+END;
+
+-- Recettes similaires précalculées par la commande compute-similar-recipes
+-- (app.similar) : ingrédients en commun (TF-IDF) et favoris en commun
+CREATE TABLE recipe_neighbours (
+  recipe_id INTEGER NOT NULL,
+  neighbour_id INTEGER NOT NULL,
+  score REAL NOT NULL, -- cosinus pondéré, entre 0 et 1
+  PRIMARY KEY (recipe_id, neighbour_id)
+) WITHOUT ROWID;
+-- Voisins d'une recette dans l'ordre d'affichage, en une recherche d'index
+CREATE INDEX idx_recipe_neighbours_score ON recipe_neighbours (recipe_id, score DESC);
+CREATE INDEX idx_recipe_neighbours_neighbour ON recipe_neighbours (neighbour_id);
+
+CREATE TRIGGER recipes_neighbours_delete AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM recipe_neighbours WHERE recipe_id = OLD.id;
+  DELETE FROM recipe_neighbours WHERE neighbour_id = OLD.id;
+END;
+
+-- Recettes supprimées récemment, pour la mise à jour incrémentale de l'index
+-- des ingrédients en mémoire (app.pantry). Seul le dernier jour est gardé :
+-- un index plus ancien est reconstruit entièrement.
+CREATE TABLE deleted_recipes (
+  recipe_id INTEGER PRIMARY KEY,
+  deleted TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_deleted_recipes_deleted ON deleted_recipes (deleted);
+
+CREATE TRIGGER recipes_deleted_log AFTER DELETE ON recipes
+BEGIN
+  DELETE FROM deleted_recipes WHERE deleted < datetime('now', '-1 day');
+  INSERT OR REPLACE INTO deleted_recipes (recipe_id) VALUES (OLD.id);
+END;
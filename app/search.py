@@ -0,0 +1,279 @@
+import base64
+import json
+import re
+from collections import namedtuple
+
+import click
+
+from app.db import get_db
+
+SEARCH_PAGE_SIZE = 24
+# Au-delà, le nombre de résultats est affiché "1000+" au lieu d'être compté
+SEARCH_COUNT_CAP = 1000
+
+# Filtres acceptés dans la query string -> condition SQL (paramètre entier)
+SEARCH_FILTERS = {
+    'difficulty': 'r.difficulty = ?',
+    'max_prep_time': 'r.prepTime <= ?',
+    'max_cook_time': 'r.cookTime <= ?',
+    'min_servings': 'r.servings >= ?',
+    'min_rating': 'r.author_grade >= ?',
+}
+
+# Tris acceptés (paramètre sort) -> (clé de tri, identifiant qui départage
+# les ex aequo, décroissant). Chacun suit un index (clé, identifiant) de
+# recipes ou recipe_stats : une page ne lit que ses lignes.
+SEARCH_SORTS = {
+    'relevance': ('f.rank', 'r.id', False),  # avec un texte de recherche seulement
+    'newest': ('r.added', 'r.id', True),
+    'rating': ('r.author_grade', 'r.id', True),
+    'prep_time': ('r.prepTime', 'r.id', False),
+    'total_time': ('r.prepTime + r.cookTime', 'r.id', False),
+    'popularity': ('s.favourite_count', 's.recipe_id', True),
+    'title': ('r.title', 'r.id', False),
+}
+
+SearchPage = namedtuple('SearchPage', 'recipes next_cursor total total_capped')
+
+# Pondération BM25 des colonnes de recipes_fts, dans l'ordre de déclaration :
+# title, description, notes, instructions, ingredients
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 1.0, 3.0)
+
+# Le document indexé pour une recette : ses champs texte, le texte de toutes
+# ses étapes et le nom de tous ses ingrédients.
+RECIPE_DOCUMENT_SQL = """
+    SELECT r.id, r.title, r.description, r.notes,
+           (SELECT group_concat(ins.instruction, ' ')
+              FROM instructions ins WHERE ins.recipe_id = r.id),
+           (SELECT group_concat(it.name, ' ')
+              FROM ingredients ing JOIN ingredient_type it ON ing.ingredient_id = it.id
+              WHERE ing.recipe_id = r.id)
+    FROM recipes r
+"""
+
+FTS_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+        title, description, notes, instructions, ingredients,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+# La colonne cachée "rank" utilise le BM25 pondéré, ce qui permet de
+# l'employer comme clé de tri et de pagination
+RANK_CONFIG_SQL = (
+    "INSERT INTO recipes_fts (recipes_fts, rank) VALUES ('rank', 'bm25(%s)')"
+    % ', '.join(str(w) for w in BM25_WEIGHTS)
+)
+
+INSERT_DOCUMENT_SQL = (
+    "INSERT INTO recipes_fts (rowid, title, description, notes, instructions, ingredients) "
+    + RECIPE_DOCUMENT_SQL
+)
+
+
+def build_match_query(q):
+    """
+    Transforme la saisie utilisateur en requête FTS5
+
+    Chaque mot est mis entre guillemets (les opérateurs FTS5 tapés par
+    l'utilisateur sont donc neutralisés) et cherché en préfixe, pour que
+    "crem brul" trouve "Crème brûlée". Les mots sont combinés par AND.
+
+    Returns:
+        str: L'expression MATCH, ou None si la saisie ne contient aucun mot
+    """
+    terms = re.findall(r'\w+', q)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def parse_filters(args):
+    """Extrait les filtres de la query string, en ignorant les valeurs non numériques"""
+    filters = {}
+    for name in SEARCH_FILTERS:
+        value = args.get(name, '').strip()
+        if value.isdigit():
+            filters[name] = int(value)
+    return filters
+
+
+def parse_sort(args, q):
+    """Tri demandé, ou le tri par défaut : pertinence avec un texte de recherche, sinon les plus récentes"""
+    sort = args.get('sort', '')
+    has_text = build_match_query(q) is not None
+    if sort in SEARCH_SORTS and (sort != 'relevance' or has_text):
+        return sort
+    return 'relevance' if has_text else 'newest'
+
+
+def encode_cursor(sort_key, recipe_id, total, total_capped):
+    """Curseur opaque de pagination : position du dernier résultat et total déjà compté"""
+    if hasattr(sort_key, 'isoformat'):
+        sort_key = sort_key.isoformat(sep=' ')
+    raw = json.dumps([sort_key, recipe_id, total, total_capped]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns: (sort_key, recipe_id, total, total_capped) ou None si le curseur
+    est invalide
+
+    Le curseur vient de l'URL : chaque champ est vérifié (clé de tri
+    texte, nombre ou null, id et total entiers, total_capped booléen) avant
+    d'être lié à une requête ou renvoyé à la page.
+    """
+    try:
+        sort_key, recipe_id, total, total_capped = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError):
+        return None
+    if (isinstance(sort_key, bool) or not isinstance(sort_key, (str, int, float, type(None)))
+            or not _is_int(recipe_id) or not _is_int(total) or not isinstance(total_capped, bool)):
+        return None
+    return sort_key, recipe_id, total, total_capped
+
+
+def _is_int(value):
+    # json décode true/false en bool, sous-classe de int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def build_search_query(q, filters, sort='newest'):
+    """
+    Construit la requête de recherche à partir du texte, des filtres et du tri
+
+    Les filtres portent sur des colonnes présentes dans les index composites
+    de recipes (idx_recipes_added, idx_recipes_difficulty) : ils sont évalués
+    sur l'index, sans lire la table.
+
+    Returns:
+        tuple: (from_sql, conditions, params, sort_key_sql, id_sql, descending)
+    """
+    conditions = []
+    params = []
+
+    match = build_match_query(q)
+    if match is None:
+        from_sql = "recipes r"
+        if sort == 'relevance':
+            sort = 'newest'
+    else:
+        from_sql = "recipes_fts f JOIN recipes r ON r.id = f.rowid"
+        conditions.append("recipes_fts MATCH ?")
+        params.append(match)
+    sort_key_sql, id_sql, descending = SEARCH_SORTS[sort]
+    if sort == 'popularity':
+        from_sql += " JOIN recipe_stats s ON s.recipe_id = r.id"
+
+    for name, value in filters.items():
+        conditions.append(SEARCH_FILTERS[name])
+        params.append(value)
+
+    return from_sql, conditions, params, sort_key_sql, id_sql, descending
+
+
+def estimate_total(db, from_sql, conditions, params):
+    """
+    Compte les résultats, sans dépasser SEARCH_COUNT_CAP lignes parcourues
+
+    Returns:
+        tuple: (total, total_capped) ; total_capped indique que le vrai
+        nombre est supérieur à total
+    """
+    where = ' AND '.join(conditions) or '1'
+    count = db.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM {from_sql} WHERE {where} LIMIT ?)",
+        (*params, SEARCH_COUNT_CAP + 1)
+    ).fetchone()[0]
+    return min(count, SEARCH_COUNT_CAP), count > SEARCH_COUNT_CAP
+
+
+def find_recipes(db, q, filters=None, cursor=None, limit=SEARCH_PAGE_SIZE, sort=None):
+    """
+    Recherche paginée et triée de recettes
+
+    Par défaut, avec un texte de recherche, les résultats sont classés par
+    pertinence (BM25), sinon du plus récent au plus ancien. La pagination
+    se fait par curseur (keyset) : une page ne coûte que limit lignes,
+    quelle que soit sa profondeur. Le total n'est compté qu'à la première
+    page, puis transmis dans le curseur.
+
+    Args:
+        q: Texte de recherche
+        filters: Filtres issus de parse_filters
+        cursor: Curseur renvoyé par la page précédente, pour le même tri
+        limit: Nombre de recettes par page
+        sort: Clé de SEARCH_SORTS, voir parse_sort
+
+    Returns:
+        SearchPage
+    """
+    sort = sort or ('relevance' if build_match_query(q) else 'newest')
+    from_sql, conditions, params, sort_key_sql, id_sql, descending = build_search_query(q, filters or {}, sort)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position is None:
+        total, total_capped = estimate_total(db, from_sql, conditions, params)
+        page_conditions, page_params = conditions, params
+    else:
+        sort_key, last_id, total, total_capped = position
+        comparison = '<' if descending else '>'
+        page_conditions = conditions + [f"({sort_key_sql}, {id_sql}) {comparison} (?, ?)"]
+        page_params = params + [sort_key, last_id]
+
+    direction = 'DESC' if descending else 'ASC'
+    rows = db.execute(
+        f"""SELECT r.*, u.username, {sort_key_sql} AS sort_key
+            FROM {from_sql}
+            JOIN user u ON r.author_id = u.id
+            WHERE {' AND '.join(page_conditions) or '1'}
+            ORDER BY {sort_key_sql} {direction}, {id_sql} {direction}
+            LIMIT ?""", (*page_params, limit + 1)
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['sort_key'], last['id'], total, total_capped)
+
+    return SearchPage(rows, next_cursor, total, total_capped)
+
+
+def index_recipe(db, recipe_id):
+    """(Ré)indexe une recette, à appeler dans la transaction qui l'écrit"""
+    db.execute("DELETE FROM recipes_fts WHERE rowid = ?", (recipe_id,))
+    db.execute(INSERT_DOCUMENT_SQL + " WHERE r.id = ?", (recipe_id,))
+
+
+def unindex_recipes(db, selected, params=()):
+    """
+    Retire des recettes de l'index, à appeler dans la transaction qui les supprime
+
+    Args:
+        selected: Requête qui renvoie les identifiants, ex. "SELECT id FROM recipes WHERE author_id = ?"
+    """
+    db.execute(f"DELETE FROM recipes_fts WHERE rowid IN ({selected})", params)
+
+
+def rebuild_index(db):
+    """Reconstruit entièrement l'index plein texte à partir des tables"""
+    db.execute(FTS_TABLE_SQL)
+    db.execute(RANK_CONFIG_SQL)
+    db.execute("DELETE FROM recipes_fts")
+    db.execute(INSERT_DOCUMENT_SQL)
+    db.execute("INSERT INTO recipes_fts (recipes_fts) VALUES ('optimize')")
+    db.commit()
+
+
+@click.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from the recipe tables."""
+    rebuild_index(get_db())
+    click.echo('Rebuilt the search index.')
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_search_index_command)
@@ -0,0 +1,168 @@
+import re
+from collections import namedtuple
+
+from app.autocomplete import fold
+
+# Recettes combinées dans une même liste de courses
+SHOPPING_MAX_RECIPES = 100
+
+# Unités reconnues (forme de normalize_unit) -> (grandeur, facteur vers
+# l'unité de base de la grandeur). Les cuillères, tasses et verres sont des
+# volumes usuels en cuisine ; les unités "à la pièce" ne se convertissent
+# qu'en elles-mêmes.
+UNITS = {
+    'mg': ('mass', 0.001),
+    'g': ('mass', 1),
+    'kg': ('mass', 1000),
+    'ml': ('volume', 1),
+    'cl': ('volume', 10),
+    'dl': ('volume', 100),
+    'l': ('volume', 1000),
+    'cuillere a cafe': ('volume', 5),
+    'cuillere a soupe': ('volume', 15),
+    'verre': ('volume', 200),
+    'tasse': ('volume', 250),
+    'piece': ('piece', 1),
+    'tranche': ('tranche', 1),
+    'pincee': ('pincee', 1),
+    'poignee': ('poignee', 1),
+    'bouquet': ('bouquet', 1),
+    'botte': ('botte', 1),
+}
+
+# Autres écritures courantes des unités de UNITS
+UNIT_ALIASES = {
+    'gr': 'g', 'gramme': 'g', 'kilo': 'kg', 'kilogramme': 'kg', 'milligramme': 'mg',
+    'millilitre': 'ml', 'centilitre': 'cl', 'decilitre': 'dl', 'litre': 'l',
+    'c a c': 'cuillere a cafe', 'cac': 'cuillere a cafe', 'cc': 'cuillere a cafe',
+    'cuillere cafe': 'cuillere a cafe',
+    'c a s': 'cuillere a soupe', 'cas': 'cuillere a soupe', 'cs': 'cuillere a soupe',
+    'cuillere soupe': 'cuillere a soupe',
+    'pc': 'piece', 'pce': 'piece', 'unite': 'piece',
+}
+
+# Affichage des grandeurs : (seuil, unité, facteur) du plus grand au plus petit
+DISPLAY_UNITS = {
+    'mass': ((1000, 'kg', 1000), (0, 'g', 1)),
+    'volume': ((1000, 'L', 1000), (0, 'ml', 1)),
+    'piece': ((0, 'pièce(s)', 1),),
+    'tranche': ((0, 'tranche(s)', 1),),
+    'pincee': ((0, 'pincée(s)', 1),),
+    'poignee': ((0, 'poignée(s)', 1),),
+    'bouquet': ((0, 'bouquet(s)', 1),),
+    'botte': ((0, 'botte(s)', 1),),
+}
+
+ShoppingList = namedtuple('ShoppingList', 'recipes items')
+
+# Toutes les lignes d'ingrédients des recettes demandées, mises à l'échelle
+# des portions voulues et additionnées par type d'ingrédient et unité saisie
+SHOPPING_SQL = """
+    WITH wanted (recipe_id, servings) AS (VALUES {values})
+    SELECT ing.ingredient_id, it.name, ing.unit,
+           SUM(ing.quantity * CASE WHEN w.servings > 0 AND r.servings > 0
+                                   THEN CAST(w.servings AS REAL) / r.servings ELSE 1 END) AS quantity
+    FROM wanted w
+    JOIN recipes r ON r.id = w.recipe_id
+    JOIN ingredients ing ON ing.recipe_id = r.id
+    JOIN ingredient_type it ON it.id = ing.ingredient_id
+    GROUP BY ing.ingredient_id, ing.unit
+"""
+
+
+def normalize_unit(unit):
+    """
+    Forme de comparaison d'une unité saisie
+
+    Sans accents, casse, points ni pluriels : "Cuillères à soupe",
+    "cuillère à soupe" et "c. à s." donnent "cuillere a soupe".
+    """
+    text = fold(unit.replace('(s)', '').replace("'", ' '))
+    words = re.findall(r'\w+', text)
+    words = [word[:-1] if len(word) > 3 and word.endswith('s') else word for word in words]
+    key = ' '.join(words)
+    return UNIT_ALIASES.get(key, key)
+
+
+def convert_unit(unit):
+    """
+    Returns:
+        tuple: (grandeur, facteur vers son unité de base), ou (unité
+        normalisée, 1) pour une unité inconnue, qui ne s'additionne
+        qu'avec elle-même
+    """
+    key = normalize_unit(unit)
+    return UNITS.get(key, (key, 1))
+
+
+def display_quantity(dimension, quantity, unit):
+    """Quantité et unité à afficher, dans l'unité la plus lisible de la grandeur"""
+    for threshold, label, factor in DISPLAY_UNITS.get(dimension, ((0, unit, 1),)):
+        if quantity >= threshold:
+            return round(quantity / factor, 2), label
+    return round(quantity, 2), unit
+
+
+def build_shopping_list(db, recipe_ids, servings=None):
+    """
+    Liste de courses combinée de plusieurs recettes
+
+    Les quantités sont mises à l'échelle (servings / recipes.servings) et
+    additionnées par SQLite en une seule requête, par type d'ingrédient et
+    unité saisie. Chaque unité distincte est ensuite convertie une fois
+    dans l'unité de base de sa grandeur : 200 g et 1 kg de farine font
+    1,2 kg, deux cuillères à soupe et 10 ml de lait font 40 ml.
+
+    Args:
+        recipe_ids: Recettes à combiner
+        servings: Nombre de portions voulu pour chaque recette, None pour
+            garder celui de la recette
+
+    Returns:
+        ShoppingList: recettes (id, title, servings) et ingrédients (dicts
+        ingredient_id, name, quantity, unit), par ordre alphabétique
+    """
+    if not recipe_ids:
+        return ShoppingList([], [])
+
+    placeholders = ', '.join('?' for _ in recipe_ids)
+    recipes = db.execute(
+        f"SELECT id, title, servings FROM recipes WHERE id IN ({placeholders}) ORDER BY title", recipe_ids
+    ).fetchall()
+
+    values = ', '.join('(?, ?)' for _ in recipe_ids)
+    params = [value for recipe_id in recipe_ids for value in (recipe_id, servings)]
+    conversions = {}
+    totals = {}
+    for row in db.execute(SHOPPING_SQL.format(values=values), params):
+        if row['unit'] not in conversions:
+            conversions[row['unit']] = convert_unit(row['unit'])
+        dimension, factor = conversions[row['unit']]
+        key = (row['ingredient_id'], dimension)
+        if key not in totals:
+            totals[key] = {'ingredient_id': row['ingredient_id'], 'name': row['name'],
+                           'dimension': dimension, 'unit': row['unit'], 'quantity': 0}
+        totals[key]['quantity'] += (row['quantity'] or 0) * factor
+
+    items = []
+    for item in sorted(totals.values(), key=lambda item: (fold(item['name']), item['dimension'])):
+        quantity, unit = display_quantity(item['dimension'], item['quantity'], item['unit'])
+        items.append({'ingredient_id': item['ingredient_id'], 'name': item['name'],
+                      'quantity': quantity, 'unit': unit})
+    return ShoppingList(recipes, items)
+
+
+def parse_shopping_args(args):
+    """
+    Lit recipe (répété) et servings d'une requête
+
+    Returns:
+        tuple: (ids de recettes sans doublon, au plus SHOPPING_MAX_RECIPES,
+        portions voulues ou None)
+    """
+    recipe_ids = []
+    for value in args.getlist('recipe'):
+        if value.isdigit() and int(value) not in recipe_ids:
+            recipe_ids.append(int(value))
+    servings = args.get('servings', type=int)
+    return recipe_ids[:SHOPPING_MAX_RECIPES], servings if servings and servings > 0 else None
@@ -0,0 +1,175 @@
+import click
+
+from app.db import get_db
+
+# Voisins gardés par recette, et affichés sur sa page
+SIMILAR_TOP_K = 12
+SIMILAR_SHOWN = 4
+# Part des favoris en commun dans le score, le reste pour les ingrédients
+FAVOURITES_WEIGHT = 0.3
+# Ingrédients présents dans plus de cette part des recettes (sel, eau...)
+# ignorés dans un grand catalogue : ils rapprochent tout de tout et
+# densifient les produits
+MAX_DOCUMENT_FREQUENCY = 0.2
+MIN_IGNORED_FREQUENCY = 1000
+# Recettes dont les voisins sont calculés à la fois (mémoire des produits creux)
+SIMILAR_BATCH_SIZE = 500
+
+# Une recherche d'index (recipe_id, score) par page de recette
+SIMILAR_RECIPES_SQL = """
+    SELECT r.id, r.title, r.image_url, r.difficulty, r.author_grade
+    FROM recipe_neighbours n
+    JOIN recipes r ON r.id = n.neighbour_id
+    WHERE n.recipe_id = ?
+    ORDER BY n.score DESC
+    LIMIT ?
+"""
+
+# Garde les k meilleurs voisins d'une recette
+TRIM_NEIGHBOURS_SQL = """
+    DELETE FROM recipe_neighbours
+    WHERE recipe_id = ? AND neighbour_id NOT IN (
+        SELECT neighbour_id FROM recipe_neighbours WHERE recipe_id = ? ORDER BY score DESC LIMIT ?
+    )
+"""
+
+
+def similar_recipes(db, recipe_id, limit=SIMILAR_SHOWN):
+    """Recettes proches de recipe_id, précalculées par compute-similar-recipes"""
+    return db.execute(SIMILAR_RECIPES_SQL, (recipe_id, limit)).fetchall()
+
+
+def _normalize_rows(matrix):
+    # Lignes de norme 1 : le produit scalaire de deux lignes est leur cosinus
+    import numpy as np
+    from scipy import sparse
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def load_features(db):
+    """
+    Matrices creuses recettes x ingrédients (TF-IDF) et recettes x
+    utilisateurs (favoris), lignes normalisées
+
+    Returns:
+        tuple: (identifiants des recettes, dans l'ordre des lignes,
+        matrice des ingrédients, matrice des favoris)
+    """
+    import numpy as np
+    from scipy import sparse
+
+    recipe_ids = np.array([row[0] for row in db.execute('SELECT id FROM recipes ORDER BY id')], dtype=np.int64)
+    n = len(recipe_ids)
+
+    def incidence(sql):
+        pairs = np.array(db.execute(sql).fetchall(), dtype=np.int64).reshape(-1, 2)
+        rows = np.searchsorted(recipe_ids, pairs[:, 0])
+        columns, pairs_columns = np.unique(pairs[:, 1], return_inverse=True)
+        return sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (rows, pairs_columns.ravel())),
+            shape=(n, len(columns))
+        )
+
+    ingredients = incidence('SELECT DISTINCT recipe_id, ingredient_id FROM ingredients')
+    document_frequency = np.bincount(ingredients.indices, minlength=ingredients.shape[1])
+    idf = np.log((1 + n) / (1 + document_frequency)) + 1
+    idf[document_frequency > max(MAX_DOCUMENT_FREQUENCY * n, MIN_IGNORED_FREQUENCY)] = 0
+    ingredients = ingredients @ sparse.diags(idf.astype(np.float32))
+    ingredients.eliminate_zeros()
+
+    favourites = incidence('SELECT recipe_id, author_id FROM favourites')
+    return recipe_ids, _normalize_rows(ingredients).tocsr(), _normalize_rows(favourites).tocsr()
+
+
+def top_neighbours(recipe_ids, ingredients, favourites, rows, top_k=SIMILAR_TOP_K, batch_size=SIMILAR_BATCH_SIZE):
+    """
+    Les top_k recettes les plus proches de chaque ligne de rows
+
+    Le score est la somme pondérée des cosinus des deux matrices, calculée
+    par produits creux sur des lots de batch_size lignes.
+
+    Returns:
+        list: (recette, voisine, score)
+    """
+    import numpy as np
+
+    ingredients_t, favourites_t = ingredients.T.tocsc(), favourites.T.tocsc()
+    neighbours = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        scores = ((1 - FAVOURITES_WEIGHT) * (ingredients[batch] @ ingredients_t)
+                  + FAVOURITES_WEIGHT * (favourites[batch] @ favourites_t)).tocsr()
+        for i, row in enumerate(batch):
+            begin, end = scores.indptr[i], scores.indptr[i + 1]
+            columns, values = scores.indices[begin:end], scores.data[begin:end]
+            keep = (columns != row) & (values > 0)
+            columns, values = columns[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                columns, values = columns[best], values[best]
+            recipe_id = int(recipe_ids[row])
+            neighbours.extend((recipe_id, int(recipe_ids[c]), float(v)) for c, v in zip(columns, values))
+    return neighbours
+
+
+def compute_similar_recipes(db, new_only=False, top_k=SIMILAR_TOP_K, batch_size=SIMILAR_BATCH_SIZE):
+    """
+    Calcule la table recipe_neighbours, en une transaction
+
+    Args:
+        new_only: Ne calculer que les recettes qui n'ont pas encore de
+            voisins, et les ajouter aux listes de leurs voisines quand
+            elles y ont leur place (le cosinus est symétrique)
+
+    Returns:
+        int: Nombre de recettes calculées
+    """
+    import numpy as np
+
+    recipe_ids, ingredients, favourites = load_features(db)
+    if new_only:
+        pending = {row[0] for row in db.execute(
+            'SELECT id FROM recipes WHERE id NOT IN (SELECT recipe_id FROM recipe_neighbours)'
+        )}
+        rows = np.flatnonzero(np.isin(recipe_ids, list(pending)))
+    else:
+        rows = np.arange(len(recipe_ids))
+    neighbours = top_neighbours(recipe_ids, ingredients, favourites, rows, top_k, batch_size)
+
+    if not new_only:
+        db.execute('DELETE FROM recipe_neighbours')
+    db.executemany('INSERT OR REPLACE INTO recipe_neighbours (recipe_id, neighbour_id, score) VALUES (?, ?, ?)',
+                   neighbours)
+    if new_only:
+        db.executemany('INSERT OR REPLACE INTO recipe_neighbours (recipe_id, neighbour_id, score) VALUES (?, ?, ?)',
+                       [(neighbour, recipe, score) for recipe, neighbour, score in neighbours])
+        db.executemany(TRIM_NEIGHBOURS_SQL, [(neighbour, neighbour, top_k) for neighbour in
+                                             {neighbour for _, neighbour, _ in neighbours}])
+    # Les pages de recettes affichent les voisins : leur ETag en dépend
+    db.execute("UPDATE data_versions SET version = version + 1, updated = CURRENT_TIMESTAMP "
+               "WHERE name = 'recipe_neighbours'")
+    db.commit()
+    return len(rows)
+
+
+@click.command('compute-similar-recipes')
+@click.option('--new-only', is_flag=True, help='Only compute recipes that have no neighbours yet.')
+@click.option('--top-k', default=SIMILAR_TOP_K, show_default=True, help='Neighbours kept per recipe.')
+@click.option('--batch-size', default=SIMILAR_BATCH_SIZE, show_default=True,
+              help='Recipes scored per sparse product (memory use).')
+def compute_similar_recipes_command(new_only, top_k, batch_size):
+    """Precompute similar recipes from shared ingredients and favourites (needs numpy and scipy)."""
+    try:
+        import numpy  # noqa: F401
+        import scipy  # noqa: F401
+    except ImportError:
+        raise click.ClickException('numpy and scipy are required: pip install numpy scipy')
+    count = compute_similar_recipes(get_db(), new_only, top_k, batch_size)
+    click.echo(f'Computed neighbours for {count} recipes.')
+
+
+def init_app(app):
+    app.cli.add_command(compute_similar_recipes_command)